@@ -1,6 +1,6 @@
 import json, re
 from collections import namedtuple, OrderedDict
-from struct import Struct
+from struct import Struct, calcsize
 
 
 class Types:
@@ -25,6 +25,17 @@ class Types:
         'text': ('s', True, chr(0), lambda x: x)
     }
 
+    # NumPy type codes corresponding to each struct format character.
+    # Character sequences are suffixed with their length, e.g. 'S10'.
+    numpyFormats = {'B': 'u1', 'h': 'i2', 'i': 'i4', 'f': 'f4', 'd': 'f8', 's': 'S'}
+
+    # Type prefixes for character sequences, which are encoded and decoded
+    # as bytes during serialization.
+    stringPrefixes = ('char', 'text')
+
+    # Characters trimmed from the end of decoded character sequences.
+    stringPadding = "\x00 \n"
+
     @classmethod
     def parseType(cls, typeDesc):
         typeMatcher = re.compile("(?P<typeStr>\w+)(\((?P<size>\d+)\))?(?P<rest>.*)")
@@ -104,6 +115,18 @@ class Types:
 
         return default
 
+    @classmethod
+    def isString(cls, typeDesc):
+        """
+        Returns whether the given type is a character sequence.
+
+        >>> Types.isString('char(10)')
+        True
+        >>> Types.isString('int')
+        False
+        """
+        return typeDesc.startswith(cls.stringPrefixes)
+
     @classmethod
     def formatValue(cls, value, typeDesc, forSerialization=True):
         """
@@ -113,12 +136,11 @@ class Types:
         For now, this converts character sequences from Python strings
         into bytes for Python's struct module.
         """
-        prefixes = ['char', 'text']
-        if list(filter(typeDesc.startswith, prefixes)):
+        if Types.isString(typeDesc):
             if forSerialization:
                 return value.encode() if isinstance(value, str) else value
             else:
-                return (value.decode() if isinstance(value, bytes) else value).rstrip("\x00 \n")
+                return (value.decode() if isinstance(value, bytes) else value).rstrip(Types.stringPadding)
         else:
             return value
 
@@ -152,7 +174,8 @@ class DBSchema:
 
     This schema class maintains the above information, as well as Python
     'namedtuple' and 'struct' instances to provide an in-memory object and
-    binary serialization/deserialization facilities.
+    binary serialization/deserialization facilities. The serialization methods
+    are generated per schema on construction (see 'initializeCodec').
 
     That is, a Python object corresponding to an instance of the schema can
     easily be created using our 'instantiate' method.
@@ -198,21 +221,148 @@ class DBSchema:
     >>> projectedSchema.unpack(schema.projectBinary(schema.pack(e1), projectedSchema))
     employeeId(id=1)
 
+    # Binary projection copies field bytes, skipping over any alignment padding.
+    >>> schema.offsets
+    [0, 4, 16]
+    >>> reordered = DBSchema('employeeSalary', [('salary', 'int'), ('dob', 'char(10)')])
+    >>> reordered.unpack(schema.projectBinary(schema.pack(e1), reordered))
+    employeeSalary(salary=100000, dob='1990-01-01')
+    >>> schema.projectBinary(schema.pack(e1), reordered) == reordered.pack(schema.project(e1, reordered))
+    True
+
     >>> schema.match(DBSchema('employee2', [('id', 'int'), ('dob', 'char(10)'), ('salary', 'int')]))
     True
+
+    # Equal schemas are distinct objects, but share their class and codec.
+    >>> schema3 = DBSchema('employee', [('id', 'int'), ('dob', 'char(10)'), ('salary', 'int')])
+    >>> schema3 is schema, schema3.clazz is schema.clazz, schema3.unpack is schema.unpack
+    (False, True, True)
+
+    # Schemas with other names share their binary layout, but not their class.
+    >>> schema4 = DBSchema('employee4', [('id', 'int'), ('dob', 'char(10)'), ('salary', 'int')])
+    >>> schema4.binrepr is schema.binrepr, schema4.offsets is schema.offsets, schema4.clazz is schema.clazz
+    (True, True, False)
     """
 
+    # Schemas constructed with the same fields and types share their binary layout, i.e.,
+    # their struct, offsets, projection functions and NumPy data type, through the most
+    # recently used of them (see 'layout'). Those that also have the same name share their
+    # namedtuple class, record class and codec (see 'classes'). Operator output schemas are
+    # named after their operator, so these mostly share only their layout.
+    # Schema objects themselves remain distinct, since they are used as dictionary keys.
+    layouts = OrderedDict()
+    classes = OrderedDict()
+    layoutLimit = 1024
+
+    # Compiled codec functions, shared by all schemas with the same field types.
+    codecs = {}
+
     def __init__(self, name, fieldsAndTypes):
         self.name = name
         if self.name and fieldsAndTypes:
             self.fields = [x[0] for x in fieldsAndTypes]
             self.types = [x[1] for x in fieldsAndTypes]
-            self.clazz = namedtuple(self.name, self.fields)
-            self.binrepr = Struct(''.join([Types.formatType(x) for x in self.types]))
-            self.size = self.binrepr.size
+
+            key = (tuple(self.fields), tuple(self.types))
+            self.layout = DBSchema.sharedSchema(DBSchema.layouts, key, self)
+            if self.layout is self:
+                self.initializeLayout()
+            else:
+                self.shareLayout(self.layout)
+
+            self.classes = DBSchema.sharedSchema(DBSchema.classes, (self.name,) + key, self)
+            if self.classes is self:
+                self.initializeClasses()
+            else:
+                self.shareClasses(self.classes)
         else:
             raise ValueError("Invalid attributes when constructing a schema")
 
+    # Returns the most recently used schema for the given key in a bounded cache,
+    # adding the given schema if there is none.
+    @staticmethod
+    def sharedSchema(cache, key, schema):
+        shared = cache.get(key, None)
+        if shared is None:
+            cache[key] = schema
+            if len(cache) > DBSchema.layoutLimit:
+                cache.popitem(last=False)
+            return schema
+
+        cache.move_to_end(key)
+        return shared
+
+    # Builds the schema's binary representation.
+    # The layout holds state that is initialized lazily and shared by schemas
+    # with the same fields and types.
+    def initializeLayout(self):
+        self.formats = [Types.formatType(x) for x in self.types]
+        self.binrepr = Struct(''.join(self.formats))
+        self.size = self.binrepr.size
+        self.stringFields = [i for (i, t) in enumerate(self.types) if Types.isString(t)]
+        self.offsets = self.fieldOffsets()
+        self.projections = {}
+        self.dtype = None
+
+    # Reuses the binary representation of an existing schema with the same fields and types.
+    def shareLayout(self, layout):
+        self.formats = layout.formats
+        self.binrepr = layout.binrepr
+        self.size = layout.size
+        self.stringFields = layout.stringFields
+        self.offsets = layout.offsets
+        self.projections = layout.projections
+
+    # Builds the schema's namedtuple class and codec. The record class is initialized
+    # lazily and shared by schemas with the same name, fields and types.
+    def initializeClasses(self):
+        self.clazz = namedtuple(self.name, self.fields)
+        self.record = None
+        self.initializeCodec()
+
+    # Reuses the class objects and codec of an existing schema with the same
+    # name, fields and types.
+    def shareClasses(self, classes):
+        self.clazz = classes.clazz
+        self.pack = classes.pack
+        self.unpack = classes.unpack
+
+    # Generates the schema's 'pack' and 'unpack' methods, which convert between
+    # instances and their binary representation.
+    # Schemas without character sequences use the struct representation directly.
+    # Otherwise, we generate functions that encode and trim character fields inline,
+    # rather than checking the type of every field on every call. The generated code
+    # only depends on the field types, so it is compiled once per distinct list of types.
+    def initializeCodec(self):
+        binpack, binunpack, make = self.binrepr.pack, self.binrepr.unpack, self.clazz._make
+
+        if not self.stringFields:
+            self.pack = lambda instance: binpack(*instance)
+            self.unpack = lambda buffer: make(binunpack(buffer))
+
+        else:
+            key = (len(self.types), tuple(self.stringFields))
+            if key not in DBSchema.codecs:
+                values = ['v' + str(i) for i in range(len(self.types))]
+                encoded = [(v + '.encode() if isinstance(' + v + ', str) else ' + v) if i in self.stringFields else v
+                           for (i, v) in enumerate(values)]
+                decoded = [(v + '.decode().rstrip(padding)') if i in self.stringFields else v
+                           for (i, v) in enumerate(values)]
+
+                source = "def pack(instance):\n" \
+                         "    (" + ', '.join(values) + ",) = instance\n" \
+                         "    return binpack(" + ', '.join(encoded) + ")\n" \
+                         "def unpack(buffer):\n" \
+                         "    (" + ', '.join(values) + ",) = binunpack(buffer)\n" \
+                         "    return make((" + ', '.join(decoded) + ",))\n"
+
+                DBSchema.codecs[key] = compile(source, '<codec>', 'exec')
+
+            codec = {'binpack': binpack, 'binunpack': binunpack, 'make': make, 'padding': Types.stringPadding}
+            exec(DBSchema.codecs[key], codec)
+            self.pack = codec['pack']
+            self.unpack = codec['unpack']
+
     # Returns a human-readable representation of this schema.
     def toString(self):
         fields = map(lambda x: '(' + ','.join(x) + ')', zip(self.fields, self.types))
@@ -265,23 +415,148 @@ class DBSchema:
                 raise ValueError("Invalid field in projection: " + f)
         return schema.instantiate(*fields)
 
-    # Project a packed tuple to a binary representation of the given schema.
-    # TODO: make this more efficient by direct field access and copying.
-    def projectBinary(self, binaryInstance, schema):
-        return schema.pack(self.project(self.unpack(binaryInstance), schema))
+    # Returns the byte offset of each field in the binary representation.
+    # This accounts for any alignment padding added by the struct module.
+    def fieldOffsets(self):
+        offsets = []
+        prefix = ''
+        for fmt in self.formats:
+            offsets.append(calcsize(prefix + fmt) - calcsize(fmt))
+            prefix += fmt
+        return offsets
+
+    # Returns a plan to project packed tuples to the binary representation of
+    # the given schema, as a list of (source start, source end, target offset)
+    # byte ranges to copy. Adjacent ranges are coalesced into a single copy.
+    # The target's fields are looked up by name, unless a list of source field
+    # indexes is given, which allows copying a source field more than once.
+    # The plan is None if a projected field changes type, requiring a re-encoding.
+    def projectionPlan(self, schema, indexes=None):
+        if indexes is None:
+            indexes = self.fieldIndexes(schema)
+
+        plan = []
+        for (i, t, offset, fmt) in zip(indexes, schema.types, schema.offsets, schema.formats):
+            if self.types[i] != t:
+                return None
+
+            start = self.offsets[i]
+            end = start + calcsize(fmt)
+            if plan and plan[-1][1] == start and plan[-1][2] + (start - plan[-1][0]) == offset:
+                plan[-1] = (plan[-1][0], end, plan[-1][2])
+            else:
+                plan.append((start, end, offset))
+        return plan
 
-    # Return a binary representation of the instance
-    def pack(self, instance):
-        if self.binrepr:
-            values = [Types.formatValue(instance[i], self.types[i])
-                      for i in range(len(instance))]
-            return self.binrepr.pack(*values)
+    # Returns the index of each of the given schema's fields in this schema.
+    def fieldIndexes(self, schema):
+        for f in schema.fields:
+            if f not in self.fields:
+                raise ValueError("Invalid field in projection: " + f)
+        return [self.fields.index(f) for f in schema.fields]
+
+    # Returns a function projecting packed tuples to the binary representation of
+    # the given schema, optionally from the given source field indexes as above.
+    # Projection functions are cached by the source fields, and the target types.
+    def projector(self, schema, indexes=None):
+        if indexes is None:
+            indexes = self.fieldIndexes(schema)
+
+        key = (tuple(indexes), tuple(schema.types))
+        if key not in self.projections:
+            plan = self.projectionPlan(schema, indexes)
+
+            if plan is None:
+                def fn(binaryInstance):
+                    values = self.unpack(binaryInstance)
+                    return schema.pack(schema.instantiate(*[values[i] for i in indexes]))
 
-    def unpack(self, buffer):
-        if self.clazz and self.binrepr:
-            values = [Types.formatValue(v, self.types[i], False)
-                      for i, v in enumerate(self.binrepr.unpack(buffer))]
-            return self.clazz._make(values)
+            elif len(plan) == 1 and plan[0][2] == 0 and plan[0][1] - plan[0][0] == schema.size:
+                (start, end, _) = plan[0]
+                fn = lambda binaryInstance: bytes(binaryInstance[start:end])
+
+            else:
+                size = schema.size
+                def fn(binaryInstance):
+                    result = bytearray(size)
+                    for (start, end, offset) in plan:
+                        result[offset:offset + end - start] = binaryInstance[start:end]
+                    return bytes(result)
+
+            self.projections[key] = fn
+        return self.projections[key]
+
+    # Project a packed tuple to a binary representation of the given schema.
+    # This copies the projected fields' bytes directly, without decoding the tuple.
+    def projectBinary(self, binaryInstance, schema):
+        return self.projector(schema)(binaryInstance)
+
+    # Returns a lazily decoded instance of this schema over the given packed tuple.
+    # Fields are decoded on first access, see the DBRecord class.
+    def view(self, buffer):
+        classes = self.classes
+        if classes.record is None:
+            classes.record = classes.initializeRecord()
+        return classes.record(buffer)
+
+    # Generates a DBRecord subclass for this schema, with one property per field.
+    # Each property decodes its field with a single-field struct at the field's offset,
+    # and caches the decoded value in a slot.
+    def initializeRecord(self):
+        source = ["class Record(DBRecord):",
+                  "    __slots__ = (" + ''.join(["'_v" + str(i) + "', " for i in range(len(self.fields))]) + ")"]
+        env = {'DBRecord': DBRecord, 'padding': Types.stringPadding}
+
+        for (i, (field, fmt, offset)) in enumerate(zip(self.fields, self.formats, self.offsets)):
+            env['unpack' + str(i)] = Struct(fmt).unpack_from
+            decode = '.decode().rstrip(padding)' if i in self.stringFields else ''
+            source += ["    def _get" + str(i) + "(self):",
+                       "        try:",
+                       "            return self._v" + str(i),
+                       "        except AttributeError:",
+                       "            value = self._v" + str(i) + " = unpack" + str(i)
+                       + "(self._buffer, " + str(offset) + ")[0]" + decode,
+                       "            return value",
+                       "    " + field + " = property(_get" + str(i) + ")"]
+
+        source += ["Record._getters = (" + ''.join(["Record._get" + str(i) + ", " for i in range(len(self.fields))]) + ")"]
+        exec('\n'.join(source), env)
+
+        record = env['Record']
+        record.__name__ = record.__qualname__ = self.name
+        record._schema = self
+        record._fields = tuple(self.fields)
+        return record
+
+    # Returns a NumPy structured data type matching the binary representation
+    # of this schema, including its field offsets and alignment padding.
+    # NumPy is only required by callers of this method.
+    def numpyDtype(self):
+        layout = self.layout
+        if layout.dtype is None:
+            import numpy as np
+            formats = [Types.numpyFormats[fmt[-1]] + fmt[:-1] for fmt in self.formats]
+            layout.dtype = np.dtype({'names': self.fields, 'formats': formats,
+                                     'offsets': self.offsets, 'itemsize': self.size})
+        return layout.dtype
+
+    # Unpacks all tuples in a page, returning a list of instances.
+    # The page provides the buffer ranges of its runs of adjacent tuples
+    # through tupleRuns(), each of which is decoded with a single iter_unpack.
+    # Character sequences are then trimmed a column at a time.
+    def unpackPage(self, page):
+        buffer = page.getbuffer()
+        values = []
+        for (start, end) in page.tupleRuns():
+            values.extend(self.binrepr.iter_unpack(buffer[start:end]))
+
+        if values and self.stringFields:
+            columns = list(zip(*values))
+            for i in self.stringFields:
+                columns[i] = [v.decode().rstrip(Types.stringPadding) for v in columns[i]]
+            values = zip(*columns)
+
+        return list(map(self.clazz._make, values))
 
     def packSchema(self):
         return json.dumps(self, cls=DBSchemaEncoder).encode()
@@ -291,6 +566,109 @@ class DBSchema:
         return json.loads(buffer.decode(), cls=DBSchemaDecoder)
 
 
+class DBRecord:
+    """
+    A base class for lazily decoded schema instances, as returned by DBSchema.view.
+
+    A record wraps the packed binary representation of a tuple, and decodes
+    each field only when it is first accessed. Thus, expressions that read
+    only a few attributes of a wide tuple do not pay for decoding the rest.
+
+    Records support the read-only parts of the namedtuple interface used by
+    our operators: attribute access, indexing, iteration, comparisons, hashing,
+    and concatenation, which returns a plain tuple. Records compare with tuples
+    and other records by their field values.
+    Records reference their buffer, so they should not outlive any changes to
+    the underlying page. The '_materialize' method returns a namedtuple copy.
+
+    >>> schema = DBSchema('employee', [('id', 'int'), ('dob', 'char(10)'), ('salary', 'int')])
+    >>> e1 = schema.instantiate(1, '1990-01-01', 100000)
+    >>> r = schema.view(schema.pack(e1))
+    >>> r.salary
+    100000
+    >>> r
+    employee(id=1, dob='1990-01-01', salary=100000)
+    >>> r[1], r[-1], len(r)
+    ('1990-01-01', 100000, 3)
+    >>> r == e1 and e1 == r and hash(r) == hash(e1)
+    True
+    >>> r._materialize()
+    employee(id=1, dob='1990-01-01', salary=100000)
+    >>> r == None, r < schema.instantiate(2, '1980-01-01', 0), sorted([e1, r]) == [r, e1]
+    (False, True, True)
+    >>> r + (1,) == e1 + (1,) and (1,) + r == (1,) + e1
+    True
+    """
+
+    __slots__ = ('_buffer',)
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        return self._getters[index](self)
+
+    def __iter__(self):
+        return (getter(self) for getter in self._getters)
+
+    def __len__(self):
+        return len(self._fields)
+
+    # Returns the field values of a record or tuple to compare or concatenate with,
+    # or None for any other object.
+    @staticmethod
+    def _values(other):
+        if isinstance(other, DBRecord):
+            return tuple(other)
+        return other if isinstance(other, tuple) else None
+
+    def __eq__(self, other):
+        values = DBRecord._values(other)
+        return NotImplemented if values is None else tuple(self) == values
+
+    def __ne__(self, other):
+        values = DBRecord._values(other)
+        return NotImplemented if values is None else tuple(self) != values
+
+    def __lt__(self, other):
+        values = DBRecord._values(other)
+        return NotImplemented if values is None else tuple(self) < values
+
+    def __le__(self, other):
+        values = DBRecord._values(other)
+        return NotImplemented if values is None else tuple(self) <= values
+
+    def __gt__(self, other):
+        values = DBRecord._values(other)
+        return NotImplemented if values is None else tuple(self) > values
+
+    def __ge__(self, other):
+        values = DBRecord._values(other)
+        return NotImplemented if values is None else tuple(self) >= values
+
+    def __add__(self, other):
+        values = DBRecord._values(other)
+        return NotImplemented if values is None else tuple(self) + values
+
+    def __radd__(self, other):
+        values = DBRecord._values(other)
+        return NotImplemented if values is None else values + tuple(self)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return self._materialize().__repr__()
+
+    def _asdict(self):
+        return OrderedDict(zip(self._fields, self))
+
+    def _materialize(self):
+        return self._schema.clazz._make(self)
+
+
 class DBSchemaEncoder(json.JSONEncoder):
     """
     Custom JSON encoder for serializing DBSchema objects.
@@ -3,6 +3,7 @@ import json, io, os, os.path
 from Catalog.Schema import DBSchema, DBSchemaEncoder, DBSchemaDecoder
 from Query.Plan import PlanBuilder
 from Query.Optimizer import Optimizer
+from Query.Compiler import PipelineCompiler
 from Storage.StorageEngine import StorageEngine
 
 
@@ -119,10 +120,46 @@ class Database:
     def processQuery(self, queryPlan):
         return queryPlan.prepare(self)
 
+    # Returns a generator over the decoded result tuples of the given query plan.
+    # The plan executes in streaming mode, so results are produced as the plan's root
+    # operator completes each output page, rather than after writing all results to a
+    # temporary relation. The plan only advances as the caller consumes its results.
+    # If a batch size is given, results are returned in lists of up to that many tuples.
+    # The operators' previous streaming modes are restored once the generator finishes
+    # or is closed, so that the plan may still be processed with processQuery.
+    def execute(self, queryPlan, batchSize=None):
+        queryPlan.prepare(self)
+        streamingModes = [(op, op.streaming) for (_, op) in queryPlan.flatten()]
+        queryPlan.root.useStreaming(True)
+        schema = queryPlan.schema()
+
+        try:
+            batch = []
+            for (_, page) in queryPlan:
+                for row in schema.unpackPage(page):
+                    if batchSize is None:
+                        yield row
+                    else:
+                        batch.append(row)
+                        if len(batch) == batchSize:
+                            yield batch
+                            batch = []
+
+            if batch:
+                yield batch
+
+        finally:
+            for (op, streaming) in streamingModes:
+                op.streaming = streaming
+
     # Returns an optimized version of the given query plan.
     def optimizeQuery(self, queryPlan):
         return optimizer.optimizeQuery(queryPlan)
 
+    # Returns a version of the given query plan with its pipelines compiled.
+    def compileQuery(self, queryPlan):
+        return PipelineCompiler().compile(queryPlan).prepare(self)
+
     # Save the database internals to the data directory.
     def checkpoint(self):
         if self.storage:
@@ -0,0 +1,178 @@
+from Catalog.Schema import Types
+from Query.Plan import Plan
+from Query.Operators.TableScan import TableScan
+from Query.Operators.Select import Select
+from Query.Operators.Project import Project
+from Query.Operators.GroupBy import GroupBy
+from Query.Operators.Pipeline import Pipeline
+from Utils.ExpressionInfo import ExpressionInfo
+
+class PipelineCompiler:
+  """
+  A query compilation class.
+
+  This replaces each chain of selections and projections over a table scan,
+  optionally ending in a group-by aggregate, with a Pipeline operator. A pipeline
+  evaluates all of its stages with a single generated function, which loops over
+  the scan's pages once, and binds tuple fields as local variables so that
+  predicates and projections are inlined as Python expressions.
+  Intermediate results are not written to temporary relations, and group-by
+  aggregates are computed with a single in-memory hash table.
+
+  The generated code only depends on the pipeline's schemas and expressions,
+  and is cached by this fingerprint across plans.
+
+  >>> import Database
+  >>> db = Database.Database()
+  >>> try:
+  ...   db.createRelation('employee', [('id', 'int'), ('age', 'int')])
+  ... except ValueError:
+  ...   pass
+  >>> schema = db.relationSchema('employee')
+
+  ### SELECT id FROM Employee WHERE age < 30
+  >>> query1 = db.query().fromTable('employee').where("age < 30").select({'id': ('id', 'int')}).finalize()
+  >>> query1 = db.compileQuery(query1)
+  >>> print(query1.explain()) # doctest: +ELLIPSIS
+  Pipeline[...,cost=...](Project[...,cost=...](projections={'id': ('id', 'int')}), Select[...,cost=...](predicate='age < 30'))
+    TableScan[...,cost=...](employee)
+  """
+
+  # Compiled pipeline code, by pipeline fingerprint.
+  cache = {}
+
+  # Returns a plan where all compilable pipelines are replaced by Pipeline operators.
+  def compile(self, plan):
+    return Plan(root=self.compileOperator(plan.root))
+
+  def compileOperator(self, operator):
+    stages = self.pipelineStages(operator)
+    if stages:
+      return Pipeline(stages, self.pipelineFunction(stages))
+
+    for attr in ['subPlan', 'lhsPlan', 'rhsPlan']:
+      if getattr(operator, attr, None) is not None:
+        setattr(operator, attr, self.compileOperator(getattr(operator, attr)))
+    return operator
+
+  # Returns the operators in the pipeline rooted at the given operator, from its
+  # table scan upwards, or None if the operator does not root a pipeline.
+  # Pipelines consist of selections and projections, with an optional group-by at the root.
+  def pipelineStages(self, operator):
+    stages = [operator]
+    if isinstance(operator, GroupBy):
+      stages.append(operator.subPlan)
+
+    while isinstance(stages[-1], (Select, Project)):
+      stages.append(stages[-1].subPlan)
+
+    if len(stages) > 1 and isinstance(stages[-1], TableScan):
+      return list(reversed(stages))
+
+  # Returns a fingerprint identifying the generated code for a pipeline.
+  def fingerprint(self, stages):
+    result = [('TableScan', tuple(stages[0].schema().schema()))]
+    for operator in stages[1:]:
+      if isinstance(operator, Select):
+        result.append(('Select', operator.selectExpr))
+      elif isinstance(operator, Project):
+        result.append(('Project', tuple([(f, operator.projectExprs[f][0]) for f in operator.schema().fields])))
+      elif isinstance(operator, GroupBy):
+        result.append(('GroupBy', len(operator.aggExprs)))
+    return tuple(result)
+
+  # Returns the pipeline's function, binding the schemas and any group-by
+  # functions referenced by its generated code.
+  def pipelineFunction(self, stages):
+    key = self.fingerprint(stages)
+    if key not in PipelineCompiler.cache:
+      source = '\n'.join(self.pipelineSource(stages))
+      PipelineCompiler.cache[key] = compile(source, '<pipeline>', 'exec')
+
+    scanSchema = stages[0].schema()
+    env = {'_unpack': scanSchema.binrepr.unpack, '_pack': stages[-1].schema().pack, '_padding': Types.stringPadding}
+
+    if isinstance(stages[-1], GroupBy):
+      groupBy = stages[-1]
+      env['_make'] = groupBy.subSchema.clazz._make
+      env['_groupExpr'] = groupBy.groupExpr
+      for (i, (init, step, final)) in enumerate(groupBy.aggExprs):
+        env['_init' + str(i)], env['_step' + str(i)], env['_final' + str(i)] = init, step, final
+
+    namespace = {}
+    exec(PipelineCompiler.cache[key], env, namespace)
+    return namespace['pipeline']
+
+  # Generates the source of a pipeline function. The function takes an iterator over
+  # the scan's pages, an output function for packed tuples, and a generator function
+  # over any completed output pages, which is called after each input page.
+  def pipelineSource(self, stages):
+    scanSchema = stages[0].schema()
+    groupBy = stages[-1] if isinstance(stages[-1], GroupBy) else None
+
+    # Character sequences are only decoded if referenced by a later stage.
+    referenced = set()
+    for operator in stages[1:]:
+      if isinstance(operator, Select):
+        referenced |= ExpressionInfo(operator.selectExpr).getAttributes()
+      elif isinstance(operator, Project):
+        for (expr, _) in operator.projectExprs.values():
+          referenced |= ExpressionInfo(expr).getAttributes()
+      elif operator is groupBy:
+        referenced |= set(operator.subSchema.fields)
+
+    source = ["def pipeline(_pages, _emit, _readyPages):"]
+    if groupBy:
+      source.append("  _groups = {}")
+    source += ["  for (_pageId, _page) in _pages:",
+               "    for _tup in _page:",
+               "      (" + ''.join([f + ", " for f in scanSchema.fields]) + ") = _unpack(_tup)"]
+
+    for i in scanSchema.stringFields:
+      field = scanSchema.fields[i]
+      if field in referenced:
+        source.append("      " + field + " = " + field + ".decode().rstrip(_padding)")
+
+    # Whether the current fields are those of the scanned tuple.
+    scanned = True
+    fields = scanSchema.fields
+
+    for operator in stages[1:]:
+      if isinstance(operator, Select):
+        source.append("      if not (" + operator.selectExpr + "):")
+        source.append("        continue")
+
+      elif isinstance(operator, Project):
+        fields = operator.schema().fields
+        exprs = [operator.projectExprs[f][0] for f in fields]
+        source.append("      (" + ''.join([f + ", " for f in fields]) + ") = ("
+                      + ''.join(["(" + e + "), " for e in exprs]) + ")")
+        scanned = False
+
+      elif operator is groupBy:
+        aggregates = range(len(groupBy.aggExprs))
+        source += ["      _row = _make((" + ''.join([f + ", " for f in fields]) + "))",
+                   "      _key = (_groupExpr(_row),)",
+                   "      _acc = _groups.get(_key, None)",
+                   "      if _acc is None:",
+                   "        _acc = _groups[_key] = [" + ''.join(["_init" + str(i) + ", " for i in aggregates]) + "]"]
+        source += ["      _acc[" + str(i) + "] = _step" + str(i) + "(_acc[" + str(i) + "], _row)" for i in aggregates]
+
+    if not groupBy:
+      if scanned:
+        source.append("      _emit(_tup)")
+      else:
+        source.append("      _emit(_pack((" + ''.join([f + ", " for f in fields]) + ")))")
+
+    source.append("    yield from _readyPages()")
+
+    if groupBy:
+      source += ["  for (_key, _acc) in _groups.items():",
+                 "    _emit(_pack(_key + (" + ''.join(["_final" + str(i) + "(_acc[" + str(i) + "]), " for i in aggregates]) + ")))",
+                 "  yield from _readyPages()"]
+
+    return source
+
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
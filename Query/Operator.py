@@ -1,3 +1,7 @@
+from Catalog.Identifiers import FileId, PageId
+from Storage.SlottedPage import SlottedPage
+
+
 class Operator:
     """
     An abstract base class for all operator implementations.
@@ -14,6 +18,9 @@ class Operator:
         self.sampled = kwargs.get("sampled", False)
         self.sampleFactor = kwargs.get("sampleFactor", 1.0)
         self.tupleCost = kwargs.get("tupleCost", 1.0)
+        self.vectorized = kwargs.get("vectorized", False)
+        self.streaming = kwargs.get("streaming", False)
+        self.concurrentGrants = kwargs.get("concurrentGrants", 0)
         self.initializeStatistics()
 
     def initializeStatistics(self):
@@ -53,7 +60,15 @@ class Operator:
         self.storage = database.storageEngine()
 
     # Create a temporary output relation, removing any existing relation.
+    # Streaming operators instead keep their output pages in memory, until
+    # they are consumed by the parent operator.
     def initializeOutput(self):
+        if self.streaming:
+            self.tempFile = None
+            self.outputPages = []
+            self.numStreamedPages = 0
+            return
+
         relId = self.relationId()
 
         if self.storage.hasRelation(relId):
@@ -80,11 +95,18 @@ class Operator:
     # The operator implementation must store this tuple in an output page, allocating a
     # new output page as necessary.
     def emitOutputTuple(self, tupleData):
-        if self.tempFile is None:
+        if self.tempFile is None and not self.streaming:
             self.initializeOutput()
 
+        if self.outputPages and not self.streaming:
+            self.refreshOutputPage()
+
         allocatePage = not (self.outputPages and self.outputPages[-1][1].header.hasFreeTuple())
-        if allocatePage:
+        if allocatePage and self.streaming:
+            outputPageId, outputPage = self.streamingPage()
+            self.outputPages.append((outputPageId, outputPage))
+
+        elif allocatePage:
             # Flush the most recently updated output page, which updates the storage file's
             # free page list to ensure correct new page allocation.
             if self.outputPages:
@@ -102,6 +124,48 @@ class Operator:
         else:
             self.actualCardinality += 1
 
+    # Re-reads the current output page if it was evicted from the buffer pool, since
+    # output pages are not pinned while they are filled. Operators reading other pages
+    # in the meantime, e.g., from spilled partitions, may otherwise write to a buffer
+    # pool frame now holding a different page.
+    def refreshOutputPage(self):
+        (outputPageId, outputPage) = self.outputPages[-1]
+        if self.storage.bufferPool.getCachedPage(outputPageId)[1] is not outputPage:
+            self.outputPages[-1] = (outputPageId, self.storage.bufferPool.getPage(outputPageId))
+
+    # Allocates an in-memory output page for streaming operators.
+    # These pages are not backed by a file, so their page ids use a negative file index
+    # unique to this operator.
+    def streamingPage(self):
+        pageId = PageId(FileId(-1 - self.id()), self.numStreamedPages)
+        self.numStreamedPages += 1
+        buffer = bytes(self.storage.bufferPool.pageSize)
+        return (pageId, SlottedPage(pageId=pageId, buffer=buffer, schema=self.schema()))
+
+    # Yields any complete output pages when streaming, for set-at-a-time operators
+    # to pass along to their parent during processing. Otherwise, output pages
+    # are written to the output relation, and we only track the last page.
+    def readyOutputPages(self):
+        if self.streaming:
+            while self.isOutputPageReady():
+                yield self.outputPage()
+
+        elif self.outputPages:
+            self.outputPages = [self.outputPages[-1]]
+
+    # Yields all remaining output pages when streaming, once processing is complete.
+    def finalOutputPages(self):
+        if self.streaming:
+            while self.outputPages:
+                yield self.outputPage()
+
+    # Yields the pages of a set-at-a-time operator's processing generator when streaming,
+    # followed by its remaining output pages. Unlike a chain of the two, closing this
+    # generator also closes the processing generator, releasing anything it holds.
+    def streamOutputPages(self, outputPages):
+        yield from outputPages
+        yield from self.finalOutputPages()
+
     # Returns whether this operator has an output page ready for its iterator.
     # This method can raise a StopIteration exception to end this operator's processing.
     def isOutputPageReady(self):
@@ -145,6 +209,52 @@ class Operator:
     def explain(self):
         return self.operatorType() + "[" + str(self.id()) + ",cost={:.2f}".format(self.cost(True)) + "]"
 
+    # Returns an iterator over this operator's output, after it has been fully consumed.
+    # This re-reads the operator's output relation rather than re-executing the operator,
+    # except when streaming, since streamed outputs are not kept.
+    def rescan(self):
+        if self.streaming:
+            return iter(self)
+        return self.storage.pages(self.relationId())
+
+    # Ends this operator's processing before its output is exhausted (e.g., under a limit).
+    # This closes any generator producing its output pages, which releases resources held
+    # during processing, and closes all of our children.
+    def close(self):
+        outputIterator, self.outputIterator = getattr(self, "outputIterator", None), None
+        if hasattr(outputIterator, "close"):
+            outputIterator.close()
+        for childOp in self.inputs():
+            childOp.close()
+
+    # Returns whether this operator requests a memory grant from the buffer pool.
+    def requestsMemory(self):
+        return False
+
+    # Returns the number of operators requesting memory grants in this operator's plan.
+    def memoryConsumers(self):
+        return int(self.requestsMemory()) + sum(childOp.memoryConsumers() for childOp in self.inputs())
+
+    # Requests a memory grant, returning the number of pages granted.
+    # Operators request their grant before opening their inputs, so the available pages
+    # are split evenly between this operator and those below it requesting grants,
+    # after keeping the given number of pages for input and output pages. Operators
+    # may also leave shares for a number of grants requested outside of their plan
+    # while they hold their own, given by the concurrentGrants parameter.
+    def requestMemory(self, reservePages):
+        bufPool = self.storage.bufferPool
+        numShares = self.memoryConsumers() + self.concurrentGrants
+        share = (bufPool.availablePages() - reservePages) // max(1, numShares)
+        return bufPool.requestPages(share, reservePages)
+
+    # Instructs this operator to stream its outputs to its parent during execution,
+    # rather than writing them to a temporary relation.
+    # This propagates the streaming mode over all of our children.
+    def useStreaming(self, streaming):
+        self.streaming = streaming
+        for childOp in self.inputs():
+            childOp.useStreaming(streaming)
+
     # Instructs this operator to perform sampling during execution.
     # This propagates the sampling rate over all of our children.
     def useSampling(self, sampled, sampleFactor):
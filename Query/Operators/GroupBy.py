@@ -1,10 +1,24 @@
 import itertools as it
 
-from Catalog.Schema import DBSchema
+from Catalog.Schema import DBSchema, Types
 from Query.Operator import Operator
+from Query.Operators.Spill import SpillPartition
+from Utils.ExpressionCompiler import ExpressionCompiler
+from Utils.ExpressionInfo import ExpressionInfo
 
 
 class GroupBy(Operator):
+    # The maximum number of spill partitions, and of recursive partitioning passes.
+    maxFanOut = 32
+    maxSpillDepth = 3
+
+    # The number of buffer pool pages left for input and output pages when granting memory.
+    reservePages = 2
+
+    # Declarative aggregates, given in aggExprs as a pair of an aggregate name and an
+    # attribute, or just the name for counts, e.g., ('sum', 'age') or ('count',).
+    aggregates = ['count', 'sum', 'min', 'max', 'avg']
+
     def __init__(self, subPlan, **kwargs):
         super().__init__(**kwargs)
 
@@ -18,9 +32,14 @@ class GroupBy(Operator):
         self.groupExpr = kwargs.get("groupExpr", None)
         self.aggExprs = kwargs.get("aggExprs", None)
         self.groupHashFn = kwargs.get("groupHashFn", None)
+        self.spillBytes = 0
+
+        # Whether all input tuples of each group are adjacent, e.g., in an ordered input.
+        self.inputGrouped = kwargs.get("inputGrouped", False)
 
         self.validateGroupBy()
         self.initializeSchema()
+        self.initializeAggregates()
 
     # Perform some basic checking on the group-by operator's parameters.
     def validateGroupBy(self):
@@ -37,6 +56,43 @@ class GroupBy(Operator):
         if len(self.aggExprs) != len(self.aggSchema.fields):
             raise ValueError("Invalid aggregate fields: schema mismatch")
 
+    # Expands any declarative aggregates into accumulator triples of an initial value, a step
+    # function and a finalizer, and compiles any group expression given as a string.
+    # The declarative aggregates are kept in aggSpecs (with None for other aggregates),
+    # and the group expression string in groupKeyExpr, for vectorized group-bys.
+    def initializeAggregates(self):
+        self.aggSpecs = [tuple(aggExpr) if self.isDeclarative(aggExpr) else None for aggExpr in self.aggExprs]
+        self.aggExprs = [self.aggregateTriple(spec) if spec else aggExpr \
+                           for (spec, aggExpr) in zip(self.aggSpecs, self.aggExprs)]
+
+        self.groupKeyExpr = None
+        if isinstance(self.groupExpr, str):
+            self.groupKeyExpr = self.groupExpr
+            self.groupExpr = ExpressionCompiler.compile(self.groupKeyExpr, [self.subSchema], globals())
+
+    # Returns whether an aggregate expression is declarative, rather than an accumulator triple.
+    @staticmethod
+    def isDeclarative(aggExpr):
+        return len(aggExpr) in [1, 2] and aggExpr[0] in GroupBy.aggregates
+
+    # Returns the accumulator triple of a declarative aggregate.
+    def aggregateTriple(self, spec):
+        if spec[0] == 'count':
+            return (0, lambda acc, e: acc + 1, lambda x: x)
+
+        if len(spec) != 2 or spec[1] not in self.subSchema.fields:
+            raise ValueError("Invalid attribute for a group-by aggregate: " + str(spec))
+
+        i = self.subSchema.fields.index(spec[1])
+        if spec[0] == 'sum':
+            return (0, lambda acc, e: acc + e[i], lambda x: x)
+        elif spec[0] == 'min':
+            return (None, lambda acc, e: e[i] if acc is None or e[i] < acc else acc, lambda x: x)
+        elif spec[0] == 'max':
+            return (None, lambda acc, e: e[i] if acc is None or e[i] > acc else acc, lambda x: x)
+        else:
+            return ((0, 0), lambda acc, e: (acc[0] + e[i], acc[1] + 1), lambda acc: acc[0] / acc[1])
+
     # Initializes the group-by's schema as a concatenation of the group-by
     # fields and all aggregate fields.
     def initializeSchema(self):
@@ -74,59 +130,276 @@ class GroupBy(Operator):
     def processInputPage(self, pageId, page):
         raise ValueError("Page-at-a-time processing not supported for joins")
 
+    # Returns whether the input is grouped on the group expression, either as given by the
+    # inputGrouped parameter, or since it is sorted by the group attributes. A sort's key
+    # attributes are those of its key expression, or of its key description for key functions,
+    # and the group attributes must be a prefix of them. Selections preserve their input's
+    # order, as do projections passing the group attributes through unchanged.
+    def isInputGrouped(self):
+        if self.inputGrouped:
+            return True
+
+        if self.subPlan.operatorType() == "Sort" and self.subPlan.sortKeyFn in [self.groupExpr, self.groupKeyExpr]:
+            return True
+
+        groupAttrs = self.groupAttributes()
+        if groupAttrs is None:
+            return False
+
+        op = self.subPlan
+        while op.operatorType() in ["Select", "Project", "SelectProject"]:
+            projectExprs = getattr(op, "projectExprs", None)
+            if projectExprs is not None and any(projectExprs.get(a, (None,))[0] != a for a in groupAttrs):
+                return False
+            op = op.subPlan
+
+        if op.operatorType() != "Sort":
+            return False
+
+        sortAttrs = self.keyAttributes(op.sortKeyFn if isinstance(op.sortKeyFn, str) else op.sortKeyDesc)
+        return sortAttrs is not None and set(sortAttrs[:len(groupAttrs)]) == set(groupAttrs)
+
+    # Returns the input attributes making up the group value, or None if the group expression
+    # computes anything else. Group expression functions are taken to return the group schema's
+    # fields from the like-named input attributes, if any.
+    def groupAttributes(self):
+        attrs = self.keyAttributes(self.groupKeyExpr) if self.groupKeyExpr else self.groupSchema.fields
+        return attrs if attrs and all(a in self.subSchema.fields for a in attrs) else None
+
+    # Returns the attributes of a key expression consisting only of attributes, or None.
+    @staticmethod
+    def keyAttributes(expr):
+        try:
+            return ExpressionInfo(expr).attributeList()
+        except SyntaxError:
+            return None
+
+    # Group-bys request a memory grant when aggregating with a hash table.
+    def requestsMemory(self):
+        return not (self.isInputGrouped() or self.vectorizedGroupFn())
+
     # Set-at-a-time operator processing
+    # When streaming, output pages are yielded as they are completed during aggregation.
+    # Otherwise, we process all pages before returning an iterator to the output relation.
     def processAllPages(self):
+        groupFn = self.vectorizedGroupFn()
 
-        relations = []
-
-        for (pageId, page) in iter(self.subPlan):
-            for tup in page:
-
-                unpackedTup = self.subSchema.unpack(tup)
-                groupByVal = tuple([self.groupExpr(unpackedTup)])
-                hashVal = str(self.groupHashFn(groupByVal))
-
-                if hashVal not in relations:
-                    self.storage.createRelation(hashVal, self.subSchema)
-                    relations.append(hashVal)
+        if groupFn:
+            outputPages = self.vectorizedAggregate(groupFn)
+        elif self.isInputGrouped():
+            outputPages = self.sortAggregate()
+        else:
+            outputPages = self.hashAggregate()
 
-                self.storage.insertTuple(hashVal, tup)
+        if self.streaming:
+            return self.streamOutputPages(outputPages)
 
-        for rel in relations:
-            for (pageId, page) in self.storage.pages(rel):
-                groups = {}
-                for tup in page:
-
-                    unpackedTup = self.subSchema.unpack(tup)
-                    groupByVal = tuple([self.groupExpr(unpackedTup)])
-
-                    if groupByVal not in groups.keys():
-                        groups[groupByVal] = [aggExpr[0] for aggExpr in self.aggExprs]
-
-                    for i, aggExpr in enumerate(self.aggExprs):
-                        groups[groupByVal][i] = aggExpr[1](groups[groupByVal][i], unpackedTup)
-
-                for groupByVal in groups.keys():
-                    for i, aggExpr in enumerate(self.aggExprs):
-                        groups[groupByVal][i] = aggExpr[2](groups[groupByVal][i])
-
-                    outputTuple = self.outputSchema.instantiate(
-                        *it.chain(list(groupByVal), groups[groupByVal])
-                    )
-                    self.emitOutputTuple(self.outputSchema.pack(outputTuple))
-
-                if self.outputPages:
-                    self.outputPages = [self.outputPages[-1]]
-
-        for rel in relations:
-            self.storage.removeRelation(rel)
+        for _ in outputPages:
+            pass
 
         return self.storage.pages(self.relationId())
 
+    # Aggregates the input with a hash table of per-group accumulators, within a buffer
+    # pool memory grant. This is a generator over any output pages ready for streaming.
+    def hashAggregate(self):
+        bufPool = self.storage.bufferPool
+        memoryPages = self.requestMemory(self.reservePages)
+        self.spillBytes = 0
+
+        try:
+            yield from self.aggregateRows(self.inputRows(iter(self.subPlan)), max(1, memoryPages), 0)
+        finally:
+            bufPool.releasePages(memoryPages)
+
+    # Returns a function computing the group values of a structured array of input tuples,
+    # or None if the group-by is not vectorized. Vectorized group-bys need a group expression
+    # string that can be evaluated over columns, and declarative aggregates over numeric
+    # attributes. Otherwise, we aggregate a tuple at a time with the accumulator triples.
+    def vectorizedGroupFn(self):
+        if not (self.vectorized and self.groupKeyExpr and all(self.aggSpecs)):
+            return None
+
+        dtype = self.subSchema.numpyDtype()
+        if any(spec[0] != 'count' and dtype[spec[1]].kind not in 'iuf' for spec in self.aggSpecs):
+            return None
+
+        return ExpressionCompiler.compileVectorizedProjection([self.groupKeyExpr], self.subSchema)
+
+    # Aggregates each input page over its columns, and merges the page's partial aggregates
+    # into per-group accumulators. Each tuple's group is numbered by its group value directly
+    # for small non-negative integer values, and otherwise by np.unique. Partial aggregates
+    # are then computed for all groups at once with np.bincount and ufunc.at reductions.
+    # Since groups are held in memory without spilling, this suits low-cardinality group values.
+    def vectorizedAggregate(self, groupFn):
+        import numpy as np
+        groups = {}
+
+        for (pageId, page) in iter(self.subPlan):
+            batch = page.asArray(self.subSchema)
+            if not len(batch):
+                continue
+
+            values = np.broadcast_to(groupFn(batch)[0], batch.shape)
+            if values.dtype.kind in 'iu' and values.min() >= 0 and values.max() < 2 * len(values) + 64:
+                groupIds = values.astype(np.intp)
+                numGroups = int(groupIds.max()) + 1
+                counts = np.bincount(groupIds, minlength=numGroups)
+                slots = counts.nonzero()[0]
+                groupVals = slots.tolist()
+            else:
+                (groupVals, groupIds) = np.unique(values, return_inverse=True)
+                numGroups = len(groupVals)
+                counts = np.bincount(groupIds, minlength=numGroups)
+                slots = range(numGroups)
+                groupVals = [v.decode().rstrip(Types.stringPadding) for v in groupVals.tolist()] \
+                              if values.dtype.kind == 'S' else groupVals.tolist()
+
+            partials = [self.partialAggregate(np, spec, batch, groupIds, numGroups, counts) for spec in self.aggSpecs]
+
+            for (groupVal, slot) in zip(groupVals, slots):
+                groupByVal = (groupVal,)
+                accs = groups.get(groupByVal, None)
+                if accs is None:
+                    accs = groups[groupByVal] = [aggExpr[0] for aggExpr in self.aggExprs]
+
+                for (i, (spec, partial)) in enumerate(zip(self.aggSpecs, partials)):
+                    accs[i] = self.mergePartial(spec[0], accs[i], partial, slot)
+
+        for (groupByVal, accs) in groups.items():
+            self.emitGroup(groupByVal, accs)
+            yield from self.readyOutputPages()
+
+    # Returns the partial aggregates of a batch of tuples, as a list indexed by group number.
+    def partialAggregate(self, np, spec, batch, groupIds, numGroups, counts):
+        if spec[0] == 'count':
+            return counts.tolist()
+
+        column = batch[spec[1]]
+        if spec[0] in ['sum', 'avg']:
+            if column.dtype.kind == 'f':
+                sums = np.bincount(groupIds, weights=column, minlength=numGroups)
+            else:
+                sums = np.zeros(numGroups, dtype=np.int64)
+                np.add.at(sums, groupIds, column)
+            return sums.tolist() if spec[0] == 'sum' else list(zip(sums.tolist(), counts.tolist()))
+
+        elif spec[0] == 'min':
+            mins = np.full(numGroups, column.max(), dtype=column.dtype)
+            np.minimum.at(mins, groupIds, column)
+            return mins.tolist()
+
+        else:
+            maxs = np.full(numGroups, column.min(), dtype=column.dtype)
+            np.maximum.at(maxs, groupIds, column)
+            return maxs.tolist()
+
+    # Merges a group's partial aggregate into its accumulator.
+    def mergePartial(self, name, acc, partial, slot):
+        value = partial[slot]
+        if name in ['count', 'sum']:
+            return acc + value
+        elif name == 'min':
+            return value if acc is None or value < acc else acc
+        elif name == 'max':
+            return value if acc is None or value > acc else acc
+        else:
+            return (acc[0] + value[0], acc[1] + value[1])
+
+    # Aggregates a grouped input, keeping only the current group's accumulators, and emitting
+    # each group as soon as the group value changes. This uses constant memory regardless of
+    # the input size, and is a generator over any output pages ready for streaming.
+    def sortAggregate(self):
+        groupByVal, accs = None, None
+
+        for row in self.inputRows(iter(self.subPlan)):
+            rowGroupByVal = (self.groupExpr(row),)
+
+            if accs is None or rowGroupByVal != groupByVal:
+                if accs is not None:
+                    self.emitGroup(groupByVal, accs)
+                    yield from self.readyOutputPages()
+                groupByVal, accs = rowGroupByVal, [aggExpr[0] for aggExpr in self.aggExprs]
+
+            for i, aggExpr in enumerate(self.aggExprs):
+                accs[i] = aggExpr[1](accs[i], row)
+
+        if accs is not None:
+            self.emitGroup(groupByVal, accs)
+            yield from self.readyOutputPages()
+
+    # Aggregates rows in a single pass into a dictionary of accumulators, keyed by group.
+    # Once the number of groups exceeds the memory budget, rows of any new group are spilled
+    # to partitions by their group hash, while existing groups continue to aggregate in memory.
+    # Each group is thus aggregated either in memory or within a single partition, and the
+    # partitions are aggregated recursively after the in-memory groups are emitted.
+    def aggregateRows(self, rows, memoryPages, depth):
+        maxGroups = max(1, (memoryPages * self.storage.bufferPool.pageSize) // self.outputSchema.size)
+        fanOut = max(2, min(self.maxFanOut, memoryPages // 2))
+        groups, spills = {}, {}
+
+        # The spilled partitions are released even if we are closed before aggregation completes.
+        try:
+            for row in rows:
+                groupByVal = (self.groupExpr(row),)
+                accs = groups.get(groupByVal, None)
+
+                if accs is None:
+                    if len(groups) >= maxGroups and depth < self.maxSpillDepth:
+                        self.spillRow(spills, self.spillPartition(groupByVal, depth, fanOut), depth, row)
+                        continue
+                    accs = groups[groupByVal] = [aggExpr[0] for aggExpr in self.aggExprs]
+
+                for i, aggExpr in enumerate(self.aggExprs):
+                    accs[i] = aggExpr[1](accs[i], row)
+
+            for (groupByVal, accs) in groups.items():
+                self.emitGroup(groupByVal, accs)
+                yield from self.readyOutputPages()
+
+            groups = None
+            for spill in spills.values():
+                spill.close()
+
+            for spill in spills.values():
+                yield from self.aggregateRows(self.inputRows(self.storage.pages(spill.relId)), memoryPages, depth + 1)
+                self.storage.removeRelation(spill.relId)
+        finally:
+            for spill in spills.values():
+                spill.close()
+                if self.storage.hasRelation(spill.relId):
+                    self.storage.removeRelation(spill.relId)
+
+    # Finalizes a group's accumulators, and emits its output tuple.
+    def emitGroup(self, groupByVal, accs):
+        aggVals = tuple([aggExpr[2](acc) for (aggExpr, acc) in zip(self.aggExprs, accs)])
+        self.emitOutputTuple(self.outputSchema.pack(groupByVal + aggVals))
+
+    # Yields the unpacked tuples in an iterator of pages.
+    def inputRows(self, pageIter):
+        for (pageId, page) in pageIter:
+            yield from self.subSchema.unpackPage(page)
+
+    # Returns the spill partition of a group. The first partitioning pass uses the group
+    # hash function, and later passes rehash the group values.
+    def spillPartition(self, groupByVal, depth, fanOut):
+        hashVal = self.groupHashFn(groupByVal) if depth == 0 else (depth, groupByVal)
+        return hash(hashVal) % fanOut
+
+    # Appends an input row to a spill partition, creating its temporary relation as needed.
+    def spillRow(self, spills, partition, depth, row):
+        if partition not in spills:
+            relId = self.relationId() + "_" + str(depth) + "_" + str(partition)
+            spills[partition] = SpillPartition(self.storage, relId, self.subSchema)
+
+        tupleData = self.subSchema.pack(row)
+        spills[partition].append(tupleData)
+        self.spillBytes += len(tupleData)
 
     # Plan and statistics information
 
     # Returns a single line description of the operator.
     def explain(self):
         return super().explain() + "(groupSchema=" + self.groupSchema.toString() \
-               + ", aggSchema=" + self.aggSchema.toString() + ")"
+               + ", aggSchema=" + self.aggSchema.toString() \
+               + (", inputGrouped=True" if self.isInputGrouped() else "") \
+               + (", spillBytes=" + str(self.spillBytes) if self.spillBytes else "") + ")"
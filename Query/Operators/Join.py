@@ -1,10 +1,24 @@
 import itertools
+import math
+import operator
+import sys
 
 from Catalog.Schema import DBSchema
 from Query.Operator import Operator
+from Query.Operators.Sort import Sort
+from Query.Operators.Spill import SpillPartition
+from Utils.ExpressionCompiler import ExpressionCompiler
+from Utils.ExpressionInfo import ExpressionInfo
 
 
 class Join(Operator):
+    # The maximum number of partitions, and of recursive partitioning passes, for hash joins.
+    maxFanOut = 32
+    maxHashDepth = 3
+
+    # The number of buffer pool pages left for input and output pages when granting memory.
+    reservePages = 2
+
     def __init__(self, lhsPlan, rhsPlan, **kwargs):
         super().__init__(**kwargs)
 
@@ -22,6 +36,14 @@ class Join(Operator):
         self.rhsKeySchema = kwargs.get("rhsKeySchema", None)
         self.lhsHashFn = kwargs.get("lhsHashFn", None)
         self.rhsHashFn = kwargs.get("rhsHashFn", None)
+        self.spillBytes = 0
+        self.partitionDepth = 0
+        self.blockSize = 0
+        self.inputSorts = []
+
+        # Whether each input is already ordered by its key schema, for sort-merge joins.
+        self.lhsSorted = kwargs.get("lhsSorted", False)
+        self.rhsSorted = kwargs.get("rhsSorted", False)
 
         self.validateJoin()
         self.initializeSchema()
@@ -29,8 +51,8 @@ class Join(Operator):
 
     # Checks the join parameters.
     def validateJoin(self):
-        # Valid join methods: "nested-loops", "block-nested-loops", "indexed", "hash"
-        if self.joinMethod not in ["nested-loops", "block-nested-loops", "indexed", "hash"]:
+        # Valid join methods: "nested-loops", "block-nested-loops", "indexed", "hash", "sort-merge"
+        if self.joinMethod not in ["nested-loops", "block-nested-loops", "indexed", "hash", "sort-merge"]:
             raise ValueError("Invalid join method in join operator")
 
         # Check all fields are valid.
@@ -44,6 +66,9 @@ class Join(Operator):
             methodParams = [self.lhsHashFn, self.lhsKeySchema, \
                             self.rhsHashFn, self.rhsKeySchema]
 
+        elif self.joinMethod == "sort-merge":
+            methodParams = [self.lhsKeySchema, self.rhsKeySchema]
+
         requireAllValid = [self.lhsPlan, self.rhsPlan, \
                            self.joinMethod, \
                            self.lhsSchema, self.rhsSchema] \
@@ -85,13 +110,30 @@ class Join(Operator):
         readableJoinTypes = {'nested-loops': 'NL'
             , 'block-nested-loops': 'BNL'
             , 'indexed': 'Index'
-            , 'hash': 'Hash'}
+            , 'hash': 'Hash'
+            , 'sort-merge': 'SortMerge'}
         return readableJoinTypes[self.joinMethod] + "Join"
 
     # Returns child operators if present
     def inputs(self):
         return [self.lhsPlan, self.rhsPlan]
 
+    # Block-based joins request a memory grant for their blocks, and hash joins
+    # for their hash tables and partitions.
+    def requestsMemory(self):
+        return self.joinMethod in ["block-nested-loops", "indexed", "hash"]
+
+    # Sort-merge joins sort each unsorted input within the sort's own memory grant.
+    def memoryConsumers(self):
+        numSorts = [self.lhsSorted, self.rhsSorted].count(False) if self.joinMethod == "sort-merge" else 0
+        return super().memoryConsumers() + numSorts
+
+    # Also closes the sorts of a sort-merge join's inputs, which are not plan operators.
+    def close(self):
+        super().close()
+        for sort in self.inputSorts:
+            sort.close()
+
     # Iterator abstraction for join operator.
     def __iter__(self):
         self.initializeOutput()
@@ -107,158 +149,527 @@ class Join(Operator):
         raise ValueError("Page-at-a-time processing not supported for joins")
 
     # Set-at-a-time operator processing
+    # Each join method is a generator, yielding output pages as they are completed
+    # when streaming. Otherwise, we process all pages before returning an iterator
+    # to the output relation.
     def processAllPages(self):
         if self.joinMethod == "nested-loops":
-            return self.nestedLoops()
+            outputPages = self.nestedLoops()
 
         elif self.joinMethod == "block-nested-loops":
-            return self.blockNestedLoops()
+            outputPages = self.blockNestedLoops()
 
         elif self.joinMethod == "indexed":
-            return self.indexedNestedLoops()
+            outputPages = self.indexedNestedLoops()
 
         elif self.joinMethod == "hash":
-            return self.hashJoin()
+            outputPages = self.hashJoin()
+
+        elif self.joinMethod == "sort-merge":
+            outputPages = self.sortMergeJoin()
 
         else:
             raise ValueError("Invalid join method in join operator")
 
+        if self.streaming:
+            return self.streamOutputPages(outputPages)
+
+        for _ in outputPages:
+            pass
+
+        # Return an iterator to the output relation
+        return self.storage.pages(self.relationId())
+
+    # Returns a function evaluating the join expression over a pair of unpacked lhs
+    # and rhs tuples. Joins without an expression match all pairs of tuples.
+    def joinPredicate(self):
+        if self.joinExpr:
+            return ExpressionCompiler.compile(self.joinExpr, [self.lhsSchema, self.rhsSchema], globals())
+        else:
+            return lambda lRow, rRow: True
+
     ##################################
     #
     # Nested loops implementation
     #
     def nestedLoops(self):
+        joinPredicate = self.joinPredicate()
+        self.initializeInner()
+
         for (lPageId, lhsPage) in iter(self.lhsPlan):
             for lTuple in lhsPage:
-                # Load the lhs once per inner loop.
-                joinExprEnv = self.loadSchema(self.lhsSchema, lTuple)
-
-                for (rPageId, rhsPage) in iter(self.rhsPlan):
-                    for rTuple in rhsPage:
-                        # Load the RHS tuple fields.
-                        joinExprEnv.update(self.loadSchema(self.rhsSchema, rTuple))
+                # Unpack the lhs once per inner loop.
+                lRow = self.lhsSchema.unpack(lTuple)
 
+                for rRows in self.innerPages():
+                    for rRow in rRows:
                         # Evaluate the join predicate, and output if we have a match.
-                        if eval(self.joinExpr, globals(), joinExprEnv):
-                            outputTuple = self.joinSchema.instantiate(*[joinExprEnv[f] for f in self.joinSchema.fields])
-                            self.emitOutputTuple(self.joinSchema.pack(outputTuple))
+                        if joinPredicate(lRow, rRow):
+                            self.emitOutputTuple(self.joinSchema.pack(lRow + rRow))
 
-                # No need to track anything but the last output page when in batch mode.
-                if self.outputPages:
-                    self.outputPages = [self.outputPages[-1]]
+                yield from self.readyOutputPages()
 
-        # Return an iterator to the output relation
-        return self.storage.pages(self.relationId())
+    ##################################
+    #
+    # Inner input access for nested loops joins.
+    #
+    # The rhs plan is only executed on the first pass over the inner input.
+    # If its unpacked tuples fit in the buffer pool's free pages, we cache them
+    # in memory for later passes. Otherwise, later passes rescan the rhs output
+    # (see Operator.rescan), which re-reads any materialized output relation.
+
+    def initializeInner(self):
+        self.innerCache = None
+        self.innerScanned = False
+
+    # Returns an iterator over lists of unpacked rhs tuples, one per rhs page.
+    def innerPages(self):
+        if self.innerCache is not None:
+            return iter(self.innerCache)
+
+        elif self.innerScanned:
+            return ([self.rhsSchema.unpack(rTuple) for rTuple in rPage] for (_, rPage) in self.rhsPlan.rescan())
+
+        return self.firstInnerPass()
+
+    def firstInnerPass(self):
+        bufPool = self.storage.bufferPool
+        budget = bufPool.numFreePages() * bufPool.pageSize
+
+        cache, numBytes = [], 0
+        for (rPageId, rPage) in iter(self.rhsPlan):
+            rRows = [self.rhsSchema.unpack(rTuple) for rTuple in rPage]
+
+            if cache is not None and rRows:
+                numBytes += len(rRows) * self.unpackedSize(rRows[0])
+                if numBytes <= budget:
+                    cache.append(rRows)
+                else:
+                    cache = None
+
+            yield rRows
+
+        self.innerScanned = True
+        self.innerCache = cache
+
+    # Estimates the memory used by an unpacked tuple, including its fields' values
+    # and its reference in a cached page's list.
+    @staticmethod
+    def unpackedSize(row):
+        return sys.getsizeof(row) + sum(map(sys.getsizeof, row)) + 8
 
     ##################################
     #
     # Block nested loops implementation
     #
-    # This attempts to use all the free pages in the buffer pool
-    # for its block of the outer relation.
-
-    # Accesses a block of pages from an iterator.
+    # This requests a memory grant for its block of the outer relation, leaving
+    # pages for the inner and output pages, and makes one pass over the inner
+    # relation per block. Each block is decoded once, and for equi-joins is hashed
+    # on its join columns so that inner tuples only probe matching outer tuples.
+
+    # Requests a grant for a block of pages, returning the number of pages granted.
+    # The granted block size is kept for plan inspection.
+    def requestBlock(self):
+        self.blockSize = self.requestMemory(self.reservePages)
+        return self.blockSize
+
+    # Accesses a block of at most blockSize pages from an iterator.
     # This method pins pages in the buffer pool during its access.
-    # We track the page ids in the block to unpin them after processing the block.
-    def accessPageBlock(self, bufPool, pageIterator):
-        blockIds = []
-        while bufPool.numFreePages() > 0:
+    # We track the pages in the block to unpin them after processing the block.
+    def accessPageBlock(self, bufPool, pageIterator, blockSize):
+        block = []
+        while len(block) < max(1, blockSize):
             try:
                 pId, page = next(pageIterator)
-                bufPool.getPage(pId, pinned=True)
-                blockIds.append(pId)
+                bufPool.pinPage(pId)
+                block.append((pId, page))
             except StopIteration:
                 pageIterator = None
                 break
 
-        return (blockIds, pageIterator)
-
+        return (block, pageIterator)
 
-    def blockNestedLoops(self):
-        self._blockNestedLoops(iter(self.lhsPlan), iter(self.rhsPlan))
-        return self.storage.pages(self.relationId())
+    # Returns a pair of functions extracting the equi-join columns of unpacked lhs
+    # and rhs tuples, and whether these equalities are the whole join expression.
+    # Both functions are None if the join expression has no equalities.
+    def equiJoinKeys(self):
+        if not self.joinExpr:
+            return (None, None, False)
 
+        (pairs, complete) = ExpressionInfo(self.joinExpr).equalityPairs(self.lhsSchema.fields, self.rhsSchema.fields)
+        if not pairs:
+            return (None, None, False)
 
-    def _blockNestedLoops(self, lPageIter, rPageIter):
-        while lPageIter is not None:
+        lhsKey = operator.itemgetter(*[self.lhsSchema.fields.index(l) for (l, _) in pairs])
+        rhsKey = operator.itemgetter(*[self.rhsSchema.fields.index(r) for (_, r) in pairs])
+        return (lhsKey, rhsKey, complete)
 
-            blockIds, lPageIter = self.accessPageBlock(self.storage.bufferPool, lPageIter)
+    def blockNestedLoops(self):
+        joinPredicate = self.joinPredicate()
+        (lhsKey, rhsKey, keysOnly) = self.equiJoinKeys()
+        self.initializeInner()
 
-            for lPageId in blockIds:
-                lPage = self.storage.bufferPool.getPage(lPageId)
-                for lTuple in lPage:
-                    joinExprEnv = self.loadSchema(self.lhsSchema, lTuple)
+        bufPool = self.storage.bufferPool
+        blockSize = self.requestBlock()
+        try:
+            lPageIter = iter(self.lhsPlan)
+            while lPageIter is not None:
+                block, lPageIter = self.accessPageBlock(bufPool, lPageIter, blockSize)
+                lRows = [self.lhsSchema.unpack(lTuple) for (_, lPage) in block for lTuple in lPage]
+                for (lPageId, _) in block:
+                    bufPool.unpinPage(lPageId)
 
-                    for (rPageId, rPage) in rPageIter:
-                        for rTuple in rPage:
-                            joinExprEnv.update(self.loadSchema(self.rhsSchema, rTuple))
+                if not lRows:
+                    continue
 
-                            if self.joinExpr:
-                                isValid = eval(self.joinExpr, globals(), joinExprEnv)
-                            else:
-                                # For some reason using this comparison causes the test to fail.
-                                #
-                                # lKey = self.lhsSchema.projectBinary(lTuple, self.lhsKeySchema)
-                                # rKey = self.rhsSchema.projectBinary(rTuple, self.rhsKeySchema)
-                                # isValid = lKey == rKey
-                                isValid = True
+                if lhsKey is not None:
+                    table = {}
+                    for lRow in lRows:
+                        table.setdefault(lhsKey(lRow), []).append(lRow)
 
-                            if isValid:
-                                outputTuple = self.joinSchema.instantiate(
-                                    *[joinExprEnv[f] for f in self.joinSchema.fields]
-                                )
-                                self.emitOutputTuple(self.joinSchema.pack(outputTuple))
+                for rRows in self.innerPages():
+                    for rRow in rRows:
+                        matches = lRows if lhsKey is None else table.get(rhsKey(rRow), ())
+                        for lRow in matches:
+                            if keysOnly or joinPredicate(lRow, rRow):
+                                self.emitOutputTuple(self.joinSchema.pack(lRow + rRow))
 
-                    if self.outputPages:
-                        self.outputPages = [self.outputPages[-1]]
+                    yield from self.readyOutputPages()
 
-                self.storage.bufferPool.unpinPage(lPageId)
+        finally:
+            bufPool.releasePages(blockSize)
 
 
     ##################################
     #
     # Indexed nested loops implementation
     #
-    # TODO: test
+    # The rhs must be a scan of the indexed relation. For each block of lhs pages,
+    # we project the lhs tuples' keys and sort them, so that the index is probed in
+    # key order with a single cursor, and each distinct key is only probed once.
+    # Matching rhs tuples are then fetched through the buffer pool.
     def indexedNestedLoops(self):
-        raise NotImplementedError
+        if self.rhsPlan.operatorType() != "TableScan":
+            raise ValueError("Invalid rhs for an indexed join, expected a table scan")
+
+        relId = self.rhsPlan.relationId()
+        lhsKey = self.lhsSchema.projector(self.lhsKeySchema)
+        rhsFilter = self.indexedTupleFilter()
+        joinPredicate = self.joinPredicate() if self.joinExpr else None
+        concatenate = self.tupleConcatenator()
+
+        bufPool = self.storage.bufferPool
+        blockSize = self.requestBlock()
+        try:
+            lPageIter = iter(self.lhsPlan)
+
+            while lPageIter is not None:
+                block, lPageIter = self.accessPageBlock(bufPool, lPageIter, blockSize)
+
+                batch = []
+                for (lPageId, lPage) in block:
+                    for lTuple in lPage:
+                        lTuple = bytes(lTuple)
+                        batch.append((lhsKey(lTuple), lTuple))
+                    bufPool.unpinPage(lPageId)
+
+                batch.sort(key=lambda entry: entry[0])
+                groups = [(key, [lTuple for (_, lTuple) in entries]) \
+                            for (key, entries) in itertools.groupby(batch, key=lambda entry: entry[0])]
+
+                lookups = self.storage.lookupKeysByIndex(relId, self.indexId, [key for (key, _) in groups])
+                for ((_, lTuples), (_, tupleIds)) in zip(groups, lookups):
+                    tupleIds.sort(key=lambda tId: (tId.pageId.pageIndex, tId.tupleIndex))
+                    rTuples = rhsFilter(self.storage.getTuple(tId) for tId in tupleIds)
+
+                    for lTuple in lTuples:
+                        lRow = self.lhsSchema.unpack(lTuple) if joinPredicate else None
+                        for rTuple in rTuples:
+                            if joinPredicate is None or joinPredicate(lRow, self.rhsSchema.unpack(rTuple)):
+                                self.emitOutputTuple(concatenate(lTuple, rTuple))
+
+                    yield from self.readyOutputPages()
+
+        finally:
+            bufPool.releasePages(blockSize)
+
+    # Returns a function applying any predicate and projection of the rhs scan to the
+    # relation tuples fetched by an indexed join, returning a list of rhs tuples.
+    def indexedTupleFilter(self):
+        scan = self.rhsPlan
+        predicate = ExpressionCompiler.compileBinary(scan.predicate, scan.relSchema, globals()) \
+                      if scan.predicate else None
+        projector = scan.relSchema.projector(scan.schema()) if scan.columns is not None else None
+
+        def tupleFilter(tuples):
+            result = [t for t in tuples if predicate is None or predicate(t)]
+            return [projector(t) for t in result] if projector else result
+
+        return tupleFilter
 
     ##################################
     #
     # Hash join implementation.
     #
+    # This builds an in-memory hash table over the lhs tuples, keyed by their packed
+    # join key, and probes it with each rhs tuple. The hash table is built within a
+    # memory grant from the buffer pool. If the lhs does not fit in the grant, we fall
+    # back to a hybrid hash join.
     def hashJoin(self):
-        lRelHashMap = self.hashPartition(self.lhsPlan, self.lhsHashFn, self.lhsSchema, "_lhs")
-        rRelHashMap = self.hashPartition(self.rhsPlan, self.rhsHashFn, self.rhsSchema, "_rhs")
-
-        for hashVal in lRelHashMap.keys():
-            lPageIter = self.storage.pages(lRelHashMap[hashVal])
-            rPageIter = self.storage.pages(rRelHashMap[hashVal])
-
-            self._blockNestedLoops(lPageIter, rPageIter)
-
-            self.storage.removeRelation(lRelHashMap[hashVal])
-            self.storage.removeRelation(rRelHashMap[hashVal])
-
-        return self.storage.pages(self.relationId())
-
-
-    def hashPartition(self, plan, hashFn, schema, side):
-        relHashMap = {}
-        for (pagId, page) in iter(plan):
+        self.spillBytes = 0
+        self.partitionDepth = 0
+        bufPool = self.storage.bufferPool
+        memoryPages = self.requestMemory(self.reservePages)
+
+        try:
+            budget = max(1, memoryPages) * bufPool.pageSize
+            hashTable = {}
+            numBytes = 0
+            lTupleIter = self.pageTuples(iter(self.lhsPlan))
+            for lTuple in lTupleIter:
+                numBytes += self.hashInsert(hashTable, lTuple)
+                if numBytes > budget:
+                    break
+            else:
+                yield from self.hashProbe(hashTable, iter(self.rhsPlan))
+                return
+
+            # Partition the lhs tuples seen so far along with the remainder of the lhs.
+            lTupleIter = itertools.chain(itertools.chain.from_iterable(hashTable.values()), lTupleIter)
+            hashTable = None
+
+            yield from self.hybridHashJoin(lTupleIter, iter(self.rhsPlan), max(1, memoryPages), 0)
+
+        finally:
+            bufPool.releasePages(memoryPages)
+
+    # Hybrid hash join, over an iterator of lhs tuples and an iterator of rhs pages.
+    #
+    # Tuples are assigned to one of a fixed number of partitions by hashing their
+    # packed join key, seeded by the recursion depth. Partition 0 is joined in memory
+    # as the inputs are read, and is only spilled if it exceeds its memory budget.
+    # The remaining partitions are spilled to temporary relations, with one pinned
+    # page per partition, and are joined once both inputs have been read.
+    # Spilled partitions that still do not fit in memory are recursively repartitioned.
+    #
+    # We size the fan-out and the in-memory partition's budget from the granted pages,
+    # with half of them at most used for the partitions' pinned pages. We track the
+    # number of bytes spilled in self.spillBytes, and the deepest partitioning pass
+    # in self.partitionDepth.
+    def hybridHashJoin(self, lTupleIter, rPageIter, memoryPages, depth):
+        bufPool = self.storage.bufferPool
+        fanOut = max(2, min(self.maxFanOut, memoryPages // 2))
+        budget = max(1, memoryPages - fanOut) * bufPool.pageSize
+        self.partitionDepth = max(self.partitionDepth, depth + 1)
+
+        lhsKey = self.lhsSchema.projector(self.lhsKeySchema)
+        rhsKey = self.rhsSchema.projector(self.rhsKeySchema)
+        lSpills, rSpills = {}, {}
+
+        # The spilled partitions are released even if we are closed before the join completes.
+        try:
+            hashTable = {}
+            numBytes = 0
+            for lTuple in lTupleIter:
+                lTuple = bytes(lTuple)
+                lKey = lhsKey(lTuple)
+                partition = hash((depth, lKey)) % fanOut
+
+                if partition == 0 and hashTable is not None:
+                    hashTable.setdefault(lKey, []).append(lTuple)
+                    numBytes += len(lTuple)
+
+                    # Spill the in-memory partition if it exceeds its budget.
+                    if numBytes > budget:
+                        for t in itertools.chain.from_iterable(hashTable.values()):
+                            self.spillTuple(lSpills, 0, self.lhsSchema, "_lhs", depth, t)
+                        hashTable = None
+                else:
+                    self.spillTuple(lSpills, partition, self.lhsSchema, "_lhs", depth, lTuple)
+
+            for spill in lSpills.values():
+                spill.close()
+
+            # Probe the in-memory partition, and spill rhs tuples of the other partitions.
+            # Tuples of partitions without any lhs tuples cannot match, and are discarded.
+            joinPredicate = self.joinPredicate() if self.joinExpr else None
+            concatenate = self.tupleConcatenator()
+
+            for (rPageId, rPage) in rPageIter:
+                for rTuple in rPage:
+                    rKey = rhsKey(rTuple)
+                    partition = hash((depth, rKey)) % fanOut
+
+                    if partition == 0 and hashTable is not None:
+                        self.hashMatch(hashTable.get(rKey, None), rTuple, joinPredicate, concatenate)
+                    elif partition in lSpills:
+                        self.spillTuple(rSpills, partition, self.rhsSchema, "_rhs", depth, bytes(rTuple))
+
+                yield from self.readyOutputPages()
+
+            hashTable = None
+            for spill in rSpills.values():
+                spill.close()
+
+            # Join each pair of spilled partitions.
+            for partition in sorted(rSpills.keys()):
+                lSpill, rSpill = lSpills[partition], rSpills[partition]
+
+                if lSpill.numBytes <= memoryPages * bufPool.pageSize:
+                    hashTable = {}
+                    for lTuple in self.pageTuples(self.storage.pages(lSpill.relId)):
+                        self.hashInsert(hashTable, lTuple)
+                    yield from self.hashProbe(hashTable, self.storage.pages(rSpill.relId))
+                    hashTable = None
+
+                elif depth < self.maxHashDepth:
+                    yield from self.hybridHashJoin(self.pageTuples(self.storage.pages(lSpill.relId)), \
+                                                   self.storage.pages(rSpill.relId), memoryPages, depth + 1)
+
+                else:
+                    yield from self.chunkedHashJoin(lSpill.relId, rSpill.relId, memoryPages)
+
+        finally:
+            for spill in itertools.chain(lSpills.values(), rSpills.values()):
+                spill.close()
+                self.storage.removeRelation(spill.relId)
+
+    # Joins a pair of spilled partitions that could not be split any further (e.g., due to
+    # a heavily skewed key) by building hash tables over chunks of the lhs fitting in the
+    # granted pages, and scanning the rhs for each chunk.
+    def chunkedHashJoin(self, lRelId, rRelId, memoryPages):
+        budget = memoryPages * self.storage.bufferPool.pageSize
+
+        lTupleIter = self.pageTuples(self.storage.pages(lRelId))
+        while lTupleIter is not None:
+            hashTable = {}
+            numBytes = 0
+            for lTuple in lTupleIter:
+                numBytes += self.hashInsert(hashTable, lTuple)
+                if numBytes > budget:
+                    break
+            else:
+                lTupleIter = None
+
+            if hashTable:
+                yield from self.hashProbe(hashTable, self.storage.pages(rRelId))
+
+    # Appends a packed tuple to a spilled partition, creating its temporary relation as needed.
+    def spillTuple(self, spills, partition, schema, side, depth, tupleData):
+        if partition not in spills:
+            relId = self.relationId() + side + "_" + str(depth) + "_" + str(partition)
+            spills[partition] = SpillPartition(self.storage, relId, schema)
+
+        spills[partition].append(tupleData)
+        self.spillBytes += len(tupleData)
+
+    # Yields the packed tuples in an iterator of pages.
+    def pageTuples(self, pageIter):
+        for (pageId, page) in pageIter:
             for tup in page:
+                yield tup
+
+    # Adds a packed lhs tuple to a hash table, returning the number of bytes added.
+    # We copy the tuple, since its page may be evicted from the buffer pool.
+    def hashInsert(self, hashTable, lTuple):
+        lTuple = bytes(lTuple)
+        lKey = self.lhsSchema.projectBinary(lTuple, self.lhsKeySchema)
+        hashTable.setdefault(lKey, []).append(lTuple)
+        return len(lTuple)
+
+    # Joins rhs pages against a hash table of lhs tuples.
+    def hashProbe(self, hashTable, rPageIter):
+        rhsKey = self.rhsSchema.projector(self.rhsKeySchema)
+        joinPredicate = self.joinPredicate() if self.joinExpr else None
+        concatenate = self.tupleConcatenator()
+
+        for (rPageId, rPage) in rPageIter:
+            for rTuple in rPage:
+                self.hashMatch(hashTable.get(rhsKey(rTuple), None), rTuple, joinPredicate, concatenate)
+
+            yield from self.readyOutputPages()
+
+    # Outputs the join of an rhs tuple with its matching lhs tuples. Tuples are only
+    # unpacked if there is an additional join expression to evaluate.
+    def hashMatch(self, matches, rTuple, joinPredicate, concatenate):
+        if matches:
+            rTuple = bytes(rTuple)
+            rRow = self.rhsSchema.unpack(rTuple) if joinPredicate else None
+
+            for lTuple in matches:
+                if joinPredicate is None or joinPredicate(self.lhsSchema.unpack(lTuple), rRow):
+                    self.emitOutputTuple(concatenate(lTuple, rTuple))
 
-                hashVal = str(eval(hashFn, globals(), self.loadSchema(schema, tup)))
-
-                if hashVal not in relHashMap.keys():
-                    relId = hashVal + side
-                    self.storage.createRelation(relId, schema)
-                    relHashMap[hashVal] = relId
-
-                self.storage.insertTuple(relHashMap[hashVal], tup)
-
-        return relHashMap
-
+    ##################################
+    #
+    # Sort-merge join implementation.
+    #
+    # This orders both inputs by their key schemas with an external sort, unless they
+    # are already sorted, and merges them. Each group of rhs tuples with the same key is
+    # buffered in memory, and joined with every lhs tuple of that key.
+    #
+    # The lhs sort holds its memory grant while the rhs is sorted, so it leaves shares
+    # of the buffer pool for the rhs sort and any grants requested within the rhs plan.
+    def sortMergeJoin(self):
+        self.inputSorts = []
+        rhsGrants = self.rhsPlan.memoryConsumers() + (0 if self.rhsSorted else 1)
+        lIter = self.sortedTuples(self.lhsPlan, self.lhsSchema, self.lhsKeySchema, self.lhsSorted, rhsGrants)
+        rIter = self.sortedTuples(self.rhsPlan, self.rhsSchema, self.rhsKeySchema, self.rhsSorted, 0)
+        joinPredicate = self.joinPredicate() if self.joinExpr else None
+        concatenate = self.tupleConcatenator()
+
+        (lKey, lTuple) = next(lIter, (None, None))
+        (rKey, rTuple) = next(rIter, (None, None))
+
+        while lTuple is not None and rTuple is not None:
+            if lKey < rKey:
+                (lKey, lTuple) = next(lIter, (None, None))
+
+            elif rKey < lKey:
+                (rKey, rTuple) = next(rIter, (None, None))
+
+            else:
+                key, group = rKey, []
+                while rTuple is not None and rKey == key:
+                    group.append(rTuple)
+                    (rKey, rTuple) = next(rIter, (None, None))
+
+                while lTuple is not None and lKey == key:
+                    lRow = self.lhsSchema.unpack(lTuple) if joinPredicate else None
+                    for groupTuple in group:
+                        if joinPredicate is None or joinPredicate(lRow, self.rhsSchema.unpack(groupTuple)):
+                            self.emitOutputTuple(concatenate(lTuple, groupTuple))
+                    (lKey, lTuple) = next(lIter, (None, None))
+
+                yield from self.readyOutputPages()
+
+    # Yields pairs of key values and packed tuples from a plan, ordered by key.
+    # Keys are compared by their unpacked values, rather than their packed bytes.
+    # Unsorted plans are ordered by a streaming external sort, which is not part of
+    # the prepared query plan and thus shares our storage engine.
+    def sortedTuples(self, plan, schema, keySchema, isSorted, concurrentGrants):
+        keyFn = ExpressionCompiler.compileBinaryProjection(keySchema.fields, schema)
+        if not isSorted:
+            # The join's input schemas may rename the plan's fields.
+            planFields = [plan.schema().fields[schema.fields.index(f)] for f in keySchema.fields]
+            plan = Sort(plan, sortKeyFn=''.join(["(" + f + "), " for f in planFields]), \
+                        sortKeyDesc=', '.join(planFields), streaming=True, concurrentGrants=concurrentGrants)
+            plan.storage = self.storage
+            self.inputSorts.append(plan)
+
+        return ((keyFn(tup), bytes(tup)) for tup in self.pageTuples(iter(plan)))
+
+    # Returns a function concatenating a packed lhs and rhs tuple into a packed output tuple.
+    # The rhs fields usually lie at a fixed offset in the output schema, in which case we
+    # only need to insert any alignment padding between the two tuples.
+    def tupleConcatenator(self):
+        shifts = [j - i for (i, j) in zip(self.rhsSchema.offsets, self.joinSchema.offsets[len(self.lhsSchema.fields):])]
+        if shifts and len(set(shifts)) == 1 and self.joinSchema.size == shifts[0] + self.rhsSchema.size:
+            padding = bytes(shifts[0] - self.lhsSchema.size)
+            return lambda lTuple, rTuple: lTuple + padding + rTuple
+
+        return lambda lTuple, rTuple: \
+            self.joinSchema.pack(self.lhsSchema.unpack(lTuple) + self.rhsSchema.unpack(rTuple))
 
     # Plan and statistics information
 
@@ -280,6 +691,41 @@ class Join(Operator):
                    "rhsKeySchema=" + self.rhsKeySchema.toString(),
                    "lhsHashFn='" + self.lhsHashFn + "'",
                    "rhsHashFn='" + self.rhsHashFn + "'"]
+                + ["spillBytes=" + str(self.spillBytes) if self.spillBytes else None]
+                + ["partitionDepth=" + str(self.partitionDepth) if self.partitionDepth else None]
+            ))) + ")"
+
+        elif self.joinMethod == "sort-merge":
+            exprs = "(" + ','.join(filter(lambda x: x is not None, (
+                ["expr='" + str(self.joinExpr) + "'" if self.joinExpr else None]
+                + ["lhsKeySchema=" + self.lhsKeySchema.toString(),
+                   "rhsKeySchema=" + self.rhsKeySchema.toString()]
+                + ["lhsSorted=True" if self.lhsSorted else None]
+                + ["rhsSorted=True" if self.rhsSorted else None]
             ))) + ")"
 
         return super().explain() + exprs
+
+    # Returns the cost of the join itself, as the number of tuple accesses and comparisons
+    # made by its join method given the cardinalities of its inputs.
+    def localCost(self, estimated):
+        numLhs = self.lhsPlan.cardinality(estimated)
+        numRhs = self.rhsPlan.cardinality(estimated)
+
+        if self.joinMethod == "nested-loops":
+            numAccesses = numLhs + 2 * numLhs * numRhs
+
+        elif self.joinMethod == "block-nested-loops":
+            bufPool = self.storage.bufferPool
+            blockPages = bufPool.availablePages() - self.reservePages
+            blockTuples = max(1, blockPages) * max(1, bufPool.pageSize // self.lhsSchema.size)
+            numAccesses = numLhs + numRhs * math.ceil(numLhs / blockTuples) + numLhs * numRhs
+
+        elif self.joinMethod == "sort-merge":
+            sortCost = lambda n, isSorted: 0 if isSorted or n < 2 else n * math.log2(n)
+            numAccesses = numLhs + numRhs + sortCost(numLhs, self.lhsSorted) + sortCost(numRhs, self.rhsSorted)
+
+        else:
+            numAccesses = numLhs + numRhs
+
+        return numAccesses * self.tupleCost
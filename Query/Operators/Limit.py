@@ -0,0 +1,132 @@
+from Query.Operator import Operator
+
+
+class Limit(Operator):
+    """
+    A limit operator, returning at most a given number of tuples from its input
+    after skipping an optional offset.
+
+    Limits run their input in streaming mode, stop pulling pages from it once they
+    have produced their last tuple, and close it so that the operators below stop
+    reading pages. Over a sort, possibly below projections, the limit instead has the
+    sort keep only its first offset + limit tuples in a bounded heap, rather than
+    sorting its whole input. Selections between the limit and a sort prevent this,
+    since the number of sorted tuples they need is not known in advance.
+    """
+
+    def __init__(self, subPlan, limit, offset=0, **kwargs):
+        super().__init__(**kwargs)
+
+        if limit is None or limit < 0 or offset < 0:
+            raise ValueError("Invalid limit or offset for a limit operator")
+
+        self.subPlan = subPlan
+        self.limit = limit
+        self.offset = offset
+
+    # Returns the output schema of this operator
+    def schema(self):
+        return self.subPlan.schema()
+
+    # Returns any input schemas for the operator if present
+    def inputSchemas(self):
+        return [self.subPlan.schema()]
+
+    # Returns a string describing the operator type
+    def operatorType(self):
+        return "Limit"
+
+    # Returns child operators if present
+    def inputs(self):
+        return [self.subPlan]
+
+    # Iterator abstraction for limit operator.
+    def __iter__(self):
+        sortInput = self.sortInput()
+        if sortInput is not None:
+            sortInput.useTopN(self.offset + self.limit)
+
+        # Otherwise, our input would produce its whole output before we see any of it.
+        self.subPlan.useStreaming(True)
+
+        self.initializeOutput()
+        self.numInputs = 0
+        self.inputIterator = iter(self.subPlan) if self.limit > 0 else None
+        self.inputFinished = self.inputIterator is None
+
+        if not (self.pipelined or self.streaming):
+            self.outputIterator = self.processAllPages()
+
+        return self
+
+    def __next__(self):
+        if self.pipelined or self.streaming:
+            while not (self.inputFinished or self.isOutputPageReady()):
+                try:
+                    pageId, page = next(self.inputIterator)
+                    self.processInputPage(pageId, page)
+                except StopIteration:
+                    self.finishInput()
+
+            return self.outputPage()
+
+        else:
+            return next(self.outputIterator)
+
+    # Returns the sort producing our input, if any. Projections preserve the number and
+    # order of their input tuples, so we may look through them.
+    def sortInput(self):
+        op = self.subPlan
+        while op.operatorType() == "Project":
+            op = op.subPlan
+        return op if op.operatorType() == "Sort" else None
+
+    # Page processing and control methods
+
+    # Page-at-a-time operator processing
+    # This raises a StopIteration exception once the last tuple has been emitted,
+    # without reading any further input pages.
+    def processInputPage(self, pageId, page):
+        end = self.offset + self.limit
+        for inputTuple in page:
+            self.numInputs += 1
+            if self.numInputs > self.offset:
+                self.emitOutputTuple(inputTuple)
+
+            if self.numInputs >= end:
+                raise StopIteration
+
+    # Stops reading input pages, closing the input in case it is not exhausted.
+    def finishInput(self):
+        if not self.inputFinished:
+            self.inputFinished = True
+            self.subPlan.close()
+
+    # Set-at-a-time operator processing
+    def processAllPages(self):
+        try:
+            while not self.inputFinished:
+                (pageId, page) = next(self.inputIterator)
+                self.processInputPage(pageId, page)
+
+                # No need to track anything but the last output page when in batch mode.
+                if self.outputPages:
+                    self.outputPages = [self.outputPages[-1]]
+
+        except StopIteration:
+            self.finishInput()
+
+        # Return an iterator to the output relation
+        return self.storage.pages(self.relationId())
+
+    # Plan and statistics information
+
+    # Returns a single line description of the operator.
+    def explain(self):
+        return super().explain() + "(limit=" + str(self.limit) \
+                 + (", offset=" + str(self.offset) if self.offset else "") + ")"
+
+    # Limits only process up to offset + limit input tuples.
+    def localCost(self, estimated):
+        numInputs = self.subPlan.cardinality(estimated)
+        return min(numInputs, self.offset + self.limit) * self.tupleCost
@@ -0,0 +1,77 @@
+from Query.Operator import Operator
+
+
+class Pipeline(Operator):
+    """
+    A compiled pipeline operator.
+
+    Pipelines replace a chain of operators over a table scan, such as
+    TableScan -> Select -> Project, with a single generated function
+    that evaluates every stage's expressions inline for each input tuple.
+    Only the pipeline's final output is written to its output relation.
+
+    Pipelines are constructed by the Query.Compiler.PipelineCompiler class.
+    The stages are the original operators, from the table scan upwards.
+    """
+
+    def __init__(self, stages, pipelineFn, **kwargs):
+        super().__init__(**kwargs)
+
+        if self.pipelined:
+            raise ValueError("Pipelined execution of compiled pipelines not supported")
+
+        self.stages = stages
+        self.scan = stages[0]
+        self.pipelineFn = pipelineFn
+
+    # Returns the output schema of this operator
+    def schema(self):
+        return self.stages[-1].schema()
+
+    # Returns any input schemas for the operator if present
+    def inputSchemas(self):
+        return [self.scan.schema()]
+
+    # Returns a string describing the operator type
+    def operatorType(self):
+        return "Pipeline"
+
+    # Returns child operators if present
+    def inputs(self):
+        return [self.scan]
+
+    # Iterator abstraction for pipeline operator.
+    def __iter__(self):
+        self.initializeOutput()
+        self.outputIterator = self.processAllPages()
+
+        return self
+
+    def __next__(self):
+        return next(self.outputIterator)
+
+    # Page-at-a-time operator processing
+    def processInputPage(self, pageId, page):
+        raise ValueError("Page-at-a-time processing not supported for pipelines")
+
+    # Set-at-a-time operator processing
+    # The pipeline function is a generator, yielding output pages as they are completed
+    # when streaming. Otherwise, we process all pages before returning an iterator
+    # to the output relation.
+    def processAllPages(self):
+        outputPages = self.pipelineFn(iter(self.scan), self.emitOutputTuple, self.readyOutputPages)
+
+        if self.streaming:
+            return self.streamOutputPages(outputPages)
+
+        for _ in outputPages:
+            pass
+
+        # Return an iterator to the output relation
+        return self.storage.pages(self.relationId())
+
+    # Plan and statistics information
+
+    # Returns a single line description of the operator.
+    def explain(self):
+        return super().explain() + "(" + ', '.join([op.explain() for op in reversed(self.stages[1:])]) + ")"
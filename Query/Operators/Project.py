@@ -1,5 +1,6 @@
 from Catalog.Schema import DBSchema
 from Query.Operator import Operator
+from Utils.ExpressionCompiler import ExpressionCompiler
 
 
 class Project(Operator):
@@ -45,13 +46,13 @@ class Project(Operator):
         self.inputIterator = iter(self.subPlan)
         self.inputFinished = False
 
-        if not self.pipelined:
+        if not (self.pipelined or self.streaming):
             self.outputIterator = self.processAllPages()
 
         return self
 
     def __next__(self):
-        if self.pipelined:
+        if self.pipelined or self.streaming:
             while not (self.inputFinished or self.isOutputPageReady()):
                 try:
                     pageId, page = next(self.inputIterator)
@@ -70,16 +71,68 @@ class Project(Operator):
         outputSchema = self.schema()
 
         if set(locals().keys()).isdisjoint(set(inputSchema.fields)):
-            for inputTuple in page:
-                # Execute the projection expressions.
-                projectExprEnv = self.loadSchema(inputSchema, inputTuple)
-                vals = {k: eval(v[0], globals(), projectExprEnv) for (k, v) in self.projectExprs.items()}
-                outputTuple = outputSchema.pack([vals[i] for i in outputSchema.fields])
-                self.emitOutputTuple(outputTuple)
+            exprs = [self.projectExprs[f][0] for f in outputSchema.fields]
+            batchProjection = ExpressionCompiler.compileVectorizedProjection(exprs, inputSchema) \
+                                 if self.vectorized else None
+
+            outputData = self.vectorizedProjection(batchProjection, page, inputSchema, outputSchema) \
+                           if batchProjection else None
+
+            if outputData is not None:
+                for offset in range(0, len(outputData), outputSchema.size):
+                    self.emitOutputTuple(outputData[offset:offset + outputSchema.size])
+
+            else:
+                projection = ExpressionCompiler.compileProjection(exprs, [inputSchema], globals())
+                for inputTuple in page:
+                    # Execute the projection expressions.
+                    outputTuple = outputSchema.pack(projection(inputSchema.unpack(inputTuple)))
+                    self.emitOutputTuple(outputTuple)
 
         else:
             raise ValueError("Overlapping variables detected with operator schema")
 
+    # Executes the projection expressions over a page's columns, and scatters their results
+    # into the packed output tuples of the page. Returns None if any result differs from the
+    # value stored in its output field, e.g., for a division by zero, a fractional value in an
+    # integer field, or an integer out of the field's range. The page is then projected a tuple
+    # at a time, which raises the corresponding error.
+    def vectorizedProjection(self, batchProjection, page, inputSchema, outputSchema):
+        import numpy as np
+        inputArray = page.asArray(inputSchema)
+        outputArray = np.zeros(len(inputArray), dtype=outputSchema.numpyDtype())
+
+        try:
+            with np.errstate(all='raise'):
+                columns = batchProjection(inputArray)
+        except ArithmeticError:
+            return None
+
+        for (field, column) in zip(outputSchema.fields, columns):
+            column = np.asarray(column)
+            fieldType = outputArray.dtype[field]
+
+            if fieldType.kind in 'iu':
+                if column.dtype.kind not in 'biu':
+                    return None
+                if column.size and (column.min() < np.iinfo(fieldType).min or column.max() > np.iinfo(fieldType).max):
+                    return None
+
+            elif fieldType.kind == 'f':
+                if column.dtype.kind not in 'biuf':
+                    return None
+
+            elif column.dtype.kind != fieldType.kind:
+                return None
+
+            outputArray[field] = column
+
+            # Floating point values may still overflow a single precision field.
+            if fieldType.kind == 'f' and (np.isfinite(column) & ~np.isfinite(outputArray[field])).any():
+                return None
+
+        return outputArray.tobytes()
+
     # Set-at-a-time operator processing
     def processAllPages(self):
         if self.inputIterator is None:
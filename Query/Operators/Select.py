@@ -1,4 +1,5 @@
 from Query.Operator import Operator
+from Utils.ExpressionCompiler import ExpressionCompiler
 
 
 class Select(Operator):
@@ -30,13 +31,13 @@ class Select(Operator):
         self.inputIterator = iter(self.subPlan)
         self.inputFinished = False
 
-        if not self.pipelined:
+        if not (self.pipelined or self.streaming):
             self.outputIterator = self.processAllPages()
 
         return self
 
     def __next__(self):
-        if self.pipelined:
+        if self.pipelined or self.streaming:
             while not (self.inputFinished or self.isOutputPageReady()):
                 try:
                     pageId, page = next(self.inputIterator)
@@ -55,13 +56,22 @@ class Select(Operator):
     def processInputPage(self, pageId, page):
         schema = self.subPlan.schema()
         if set(locals().keys()).isdisjoint(set(schema.fields)):
-            for inputTuple in page:
-                # Load tuple fields into the select expression context
-                selectExprEnv = self.loadSchema(schema, inputTuple)
-
-                # Execute the predicate.
-                if eval(self.selectExpr, globals(), selectExprEnv):
-                    self.emitOutputTuple(inputTuple)
+            batchPredicate = ExpressionCompiler.compileVectorized(self.selectExpr, schema) \
+                                if self.vectorized else None
+
+            if batchPredicate:
+                # Execute the predicate over the page's columns, and output the matching tuples.
+                matches = batchPredicate(page.asArray(schema)).nonzero()[0]
+                inputTuples = page.tupleViews() if len(matches) else []
+                for i in matches:
+                    self.emitOutputTuple(inputTuples[i])
+
+            else:
+                predicate = ExpressionCompiler.compile(self.selectExpr, [schema], globals())
+                for inputTuple in page:
+                    # Execute the predicate over the tuple's fields.
+                    if predicate(schema.unpack(inputTuple)):
+                        self.emitOutputTuple(inputTuple)
         else:
             raise ValueError("Overlapping variables detected with operator schema")
 
@@ -0,0 +1,148 @@
+from Catalog.Schema import DBSchema
+from Query.Operator import Operator
+from Utils.ExpressionCompiler import ExpressionCompiler
+from Utils.ExpressionInfo import ExpressionInfo
+
+
+class SelectProject(Operator):
+    """
+    A fused selection and projection operator implementation.
+
+    This evaluates a selection predicate, followed by a dictionary of projection
+    expressions in the same format as the Project operator, in a single pass
+    over its input. Either of these may be omitted.
+
+    Predicates are evaluated directly over packed input tuples, decoding only the
+    attributes they reference. Projections consisting solely of input attributes
+    copy the attributes' bytes into the output tuple without decoding them.
+
+    These operators are introduced by the optimizer in place of a projection over
+    a selection (see Optimizer.fuseOperators).
+    """
+
+    def __init__(self, subPlan, selectExpr=None, projectExprs=None, **kwargs):
+        super().__init__(**kwargs)
+        self.subPlan = subPlan
+        self.selectExpr = selectExpr
+        self.projectExprs = projectExprs
+
+        if self.selectExpr is None and self.projectExprs is None:
+            raise ValueError("Invalid select-project operator, missing a predicate or projection")
+
+        if self.projectExprs is not None:
+            self.outputSchema = DBSchema(self.relationId(), \
+                                         [(k, v[1]) for (k, v) in self.projectExprs.items()])
+        else:
+            self.outputSchema = None
+
+    # Returns the output schema of this operator
+    def schema(self):
+        return self.outputSchema if self.outputSchema else self.subPlan.schema()
+
+    # Returns any input schemas for the operator if present
+    def inputSchemas(self):
+        return [self.subPlan.schema()]
+
+    # Returns a string describing the operator type
+    def operatorType(self):
+        return "SelectProject"
+
+    # Returns child operators if present
+    def inputs(self):
+        return [self.subPlan]
+
+    # Iterator abstraction for select-project operator.
+
+    def __iter__(self):
+        self.initializeOutput()
+        self.initializeFunctions()
+        self.inputIterator = iter(self.subPlan)
+        self.inputFinished = False
+
+        if not (self.pipelined or self.streaming):
+            self.outputIterator = self.processAllPages()
+
+        return self
+
+    def __next__(self):
+        if self.pipelined or self.streaming:
+            while not (self.inputFinished or self.isOutputPageReady()):
+                try:
+                    pageId, page = next(self.inputIterator)
+                    self.processInputPage(pageId, page)
+                except StopIteration:
+                    self.inputFinished = True
+
+            return self.outputPage()
+
+        else:
+            return next(self.outputIterator)
+
+    # Page processing and control methods
+
+    # Compiles the predicate and projection over the input schema, once per scan.
+    def initializeFunctions(self):
+        inputSchema = self.subPlan.schema()
+        if set(locals().keys()).isdisjoint(set(inputSchema.fields)):
+            self.predicate = ExpressionCompiler.compileBinary(self.selectExpr, inputSchema, globals()) \
+                               if self.selectExpr else None
+            self.projectorFn = self.projector(inputSchema)
+        else:
+            raise ValueError("Overlapping variables detected with operator schema")
+
+    # Returns a function computing the packed output tuple for a packed input tuple.
+    # Projections of input attributes with unchanged types only copy bytes, and
+    # may reference the same input attribute more than once.
+    def projector(self, inputSchema):
+        if self.projectExprs is None:
+            return None
+
+        outputSchema = self.schema()
+        exprs = [self.projectExprs[f][0] for f in outputSchema.fields]
+        attributes = [e.strip() for e in exprs]
+        if all(map(lambda e: e in inputSchema.fields and ExpressionInfo(e).isAttribute(), attributes)):
+            indexes = [inputSchema.fields.index(e) for e in attributes]
+            if inputSchema.projectionPlan(outputSchema, indexes) is not None:
+                return inputSchema.projector(outputSchema, indexes)
+
+        projection = ExpressionCompiler.compileBinaryProjection(exprs, inputSchema, globals())
+        return lambda inputTuple: outputSchema.pack(projection(inputTuple))
+
+    # Page-at-a-time operator processing
+    def processInputPage(self, pageId, page):
+        predicate = self.predicate
+        projector = self.projectorFn
+
+        for inputTuple in page:
+            if predicate is None or predicate(inputTuple):
+                self.emitOutputTuple(projector(inputTuple) if projector else inputTuple)
+
+    # Set-at-a-time operator processing
+    def processAllPages(self):
+        if self.inputIterator is None:
+            self.inputIterator = iter(self.subPlan)
+
+        # Process all pages from the child operator.
+        try:
+            for (pageId, page) in self.inputIterator:
+                self.processInputPage(pageId, page)
+
+                # No need to track anything but the last output page when in batch mode.
+                if self.outputPages:
+                    self.outputPages = [self.outputPages[-1]]
+
+        # To support pipelined operation, processInputPage may raise a
+        # StopIteration exception during its work. We catch this and ignore in batch mode.
+        except StopIteration:
+            pass
+
+        # Return an iterator to the output relation
+        return self.storage.pages(self.relationId())
+
+    # Plan and statistics information
+
+    # Returns a single line description of the operator.
+    def explain(self):
+        exprs = ["predicate='" + str(self.selectExpr) + "'" if self.selectExpr else None,
+                 "projections=" + str(self.projectExprs) if self.projectExprs else None]
+        return super().explain() + "(" + ', '.join(filter(lambda x: x is not None, exprs)) + ")"
@@ -1,14 +1,41 @@
+import heapq
+import itertools
+import math
+
 from Catalog.Schema import DBSchema
 from Query.Operator import Operator
+from Query.Operators.Spill import SpillPartition
+from Utils.ExpressionCompiler import ExpressionCompiler
 
 # Operator for External Sort
 class Sort(Operator):
+  """
+  An external merge sort.
+
+  The sort key is given by sortKeyFn, either as a function over an input tuple,
+  or as an expression string which is compiled over packed tuples. Tuples are
+  ordered by ascending key, unless the descending flag is set. Sorts under a limit
+  only return their first topN tuples, which are kept in a bounded heap.
+
+  The sort requests a memory grant from the buffer pool. Inputs that fit in the
+  grant are sorted in memory. Otherwise, runs are generated by replacement selection
+  over a heap of the granted size, and written to temporary relations. Runs are then
+  merged with a heap-based k-way merge, whose fan-in is bounded by the granted pages,
+  using additional merge passes as needed. The final merge produces the sort's output,
+  which may be streamed to the parent operator.
+  """
+
+  # The number of buffer pool pages left for input and output pages when granting memory.
+  reservePages = 2
 
   def __init__(self, subPlan, **kwargs):
     super().__init__(**kwargs)
     self.subPlan     = subPlan
     self.sortKeyFn   = kwargs.get("sortKeyFn", None)
     self.sortKeyDesc = kwargs.get("sortKeyDesc", None)
+    self.descending  = kwargs.get("descending", False)
+    self.topN        = None
+    self.numRuns     = 0
 
     if self.sortKeyFn is None or self.sortKeyDesc is None:
       raise ValueError("No sort key extractor provided to a sort operator")
@@ -32,24 +59,199 @@ class Sort(Operator):
 
   # Iterator abstraction for external sort operator.
   def __iter__(self):
-    raise NotImplementedError
+    self.initializeOutput()
+    self.outputIterator = self.processAllPages()
+
+    return self
 
   def __next__(self):
-    raise NotImplementedError
+    return next(self.outputIterator)
 
   # Page processing and control methods
 
   # Page-at-a-time operator processing
   def processInputPage(self, pageId, page):
-    raise NotImplementedError
+    raise ValueError("Page-at-a-time processing not supported for sorts")
 
   # Set-at-a-time operator processing
+  # When streaming, output pages are yielded as they are completed during the final merge.
+  # Otherwise, we process all pages before returning an iterator to the output relation.
   def processAllPages(self):
-    raise NotImplementedError
+    outputPages = self.externalSort()
+
+    if self.streaming:
+      return self.streamOutputPages(outputPages)
+
+    for _ in outputPages:
+      pass
+
+    return self.storage.pages(self.relationId())
+
+  # Sorts always request a memory grant.
+  def requestsMemory(self):
+    return True
+
+  # Restricts the sort's output to its first n tuples, or all tuples if None.
+  def useTopN(self, n):
+    self.topN = n
+
+  # Returns a function computing the sort key of a packed tuple.
+  def sortKey(self):
+    schema = self.subPlan.schema()
+    if isinstance(self.sortKeyFn, str):
+      keyFn = ExpressionCompiler.compileBinary(self.sortKeyFn, schema, globals())
+    else:
+      keyFn = lambda tupleData: self.sortKeyFn(schema.view(tupleData))
+
+    if self.descending:
+      return lambda tupleData: DescendingKey(keyFn(tupleData))
+    return keyFn
+
+  # Sorts the input within a memory grant. This is a generator over any output pages
+  # ready for streaming.
+  def externalSort(self):
+    bufPool = self.storage.bufferPool
+    memoryPages = self.requestMemory(self.reservePages)
+    keyFn = self.sortKey()
+    runs = []
+
+    try:
+      budget = max(1, memoryPages) * bufPool.pageSize
+      if self.topN is not None and self.topN * self.subPlan.schema().size <= budget:
+        inMemory = heapq.nsmallest(self.topN, self.inputTuples(), key=keyFn)
+      else:
+        inMemory = self.generateRuns(keyFn, budget, runs)
+      self.numRuns = len(runs)
+
+      if inMemory is not None:
+        sortedTuples = iter(inMemory)
+
+      else:
+        fanIn = max(2, memoryPages - 1)
+        mergePass = 1
+        while len(runs) > fanIn:
+          runs[:] = [self.mergeRuns(runs[i:i + fanIn], keyFn, mergePass, i // fanIn) \
+                       for i in range(0, len(runs), fanIn)]
+          mergePass += 1
+
+        sortedTuples = heapq.merge(*[self.runTuples(run) for run in runs], key=keyFn)
+
+      for tupleData in itertools.islice(sortedTuples, self.topN):
+        self.emitOutputTuple(tupleData)
+        yield from self.readyOutputPages()
+
+    finally:
+      for run in runs:
+        self.storage.removeRelation(run.relId)
+      bufPool.releasePages(memoryPages)
+
+  # Reads the input, returning a sorted list of its packed tuples if they fit in the
+  # given number of bytes. Otherwise, this appends sorted runs to the given list
+  # and returns None.
+  #
+  # Runs are generated by replacement selection: once the heap is full, we repeatedly
+  # write out its smallest tuple and replace it with the next input tuple. Input tuples
+  # ordered before the tuple just written are tagged for the next run, which on average
+  # yields runs twice the size of memory.
+  def generateRuns(self, keyFn, budget, runs):
+    schema = self.subPlan.schema()
+    tupleIter = self.inputTuples()
+    heap, numBytes = [], 0
+
+    # Entries are (run, key, sequence number, tuple), where the sequence number
+    # preserves the input order of equal keys and avoids comparing tuples.
+    for tupleData in tupleIter:
+      heap.append((0, keyFn(tupleData), len(heap), tupleData))
+      numBytes += len(tupleData)
+      if numBytes > budget:
+        break
+    else:
+      heap.sort()
+      return [tupleData for (_, _, _, tupleData) in heap]
+
+    heapq.heapify(heap)
+    seq = len(heap)
+    for tupleData in tupleIter:
+      key = keyFn(tupleData)
+      (run, minKey, _, minTuple) = heap[0]
+      self.appendToRun(runs, run, minTuple, schema)
+      heapq.heapreplace(heap, (run + 1 if key < minKey else run, key, seq, tupleData))
+      seq += 1
+
+    while heap:
+      (run, _, _, minTuple) = heapq.heappop(heap)
+      self.appendToRun(runs, run, minTuple, schema)
+
+    runs[-1].close()
+    return None
+
+  # Yields copies of the packed tuples of the input.
+  def inputTuples(self):
+    for (_, page) in iter(self.subPlan):
+      for tupleData in page:
+        yield bytes(tupleData)
+
+  # Appends a packed tuple to the given run, starting a new run as needed.
+  def appendToRun(self, runs, run, tupleData, schema):
+    if run == len(runs):
+      if runs:
+        runs[-1].close()
+      runs.append(SpillPartition(self.storage, self.runRelationId(0, run), schema))
+
+    runs[run].append(tupleData)
+
+  # Merges a group of runs into a single run for the given merge pass.
+  def mergeRuns(self, group, keyFn, mergePass, index):
+    merged = SpillPartition(self.storage, self.runRelationId(mergePass, index), self.subPlan.schema())
+    for tupleData in heapq.merge(*[self.runTuples(run) for run in group], key=keyFn):
+      merged.append(tupleData)
+    merged.close()
+
+    for run in group:
+      self.storage.removeRelation(run.relId)
+
+    return merged
+
+  # Yields the packed tuples of a run.
+  def runTuples(self, run):
+    for (_, page) in self.storage.pages(run.relId):
+      for tupleData in page:
+        yield bytes(tupleData)
+
+  def runRelationId(self, mergePass, index):
+    return self.relationId() + "_run_" + str(mergePass) + "_" + str(index)
 
 
   # Plan and statistics information
 
   # Returns a single line description of the operator.
   def explain(self):
-    return super().explain() + "(sortKeyDesc='" + str(self.sortKeyDesc) + "')"
+    exprs = ["sortKeyDesc='" + str(self.sortKeyDesc) + "'",
+             "descending=True" if self.descending else None,
+             "topN=" + str(self.topN) if self.topN is not None else None,
+             "runs=" + str(self.numRuns) if self.numRuns else None]
+    return super().explain() + "(" + ', '.join(filter(lambda x: x is not None, exprs)) + ")"
+
+  # Returns the cost of the sort, as the number of key comparisons of an in-memory sort,
+  # or of a bounded heap of topN tuples.
+  def localCost(self, estimated):
+    numInputs = self.subPlan.cardinality(estimated)
+    n = numInputs if self.topN is None else min(numInputs, self.topN)
+    return (numInputs * math.log2(n) if n > 1 else numInputs) * self.tupleCost
+
+
+class DescendingKey:
+  """
+  A sort key wrapper inverting the order of its key, for descending sorts.
+  """
+
+  __slots__ = ("key",)
+
+  def __init__(self, key):
+    self.key = key
+
+  def __lt__(self, other):
+    return other.key < self.key
+
+  def __eq__(self, other):
+    return self.key == other.key
@@ -0,0 +1,37 @@
+class SpillPartition:
+    """
+    A temporary relation holding one partition of a hash join's or group-by's
+    input, or one run of an external sort.
+
+    Tuples are appended a page at a time, keeping the partition's current page
+    pinned in the buffer pool until it is full, rather than inserting each tuple
+    through the storage engine.
+    """
+
+    def __init__(self, storage, relId, schema):
+        self.storage = storage
+        self.relId = relId
+        self.numBytes = 0
+
+        if self.storage.hasRelation(relId):
+            self.storage.removeRelation(relId)
+
+        self.storage.createRelation(relId, schema)
+        self.file = self.storage.fileMgr.relationFile(relId)[1]
+        self.pageId, self.page = None, None
+
+    def append(self, tupleData):
+        if self.page is None or not self.page.header.hasFreeTuple():
+            self.close()
+            self.pageId = self.file.availablePage()
+            self.page = self.storage.bufferPool.getPage(self.pageId, pinned=True)
+
+        self.page.insertTuple(tupleData)
+        self.numBytes += len(tupleData)
+
+    # Unpins and writes out the current page.
+    def close(self):
+        if self.page is not None:
+            self.storage.bufferPool.unpinPage(self.pageId)
+            self.storage.bufferPool.flushPage(self.pageId)
+            self.pageId, self.page = None, None
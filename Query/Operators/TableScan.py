@@ -1,19 +1,59 @@
 import random
+from Catalog.Identifiers import FileId, PageId
+from Catalog.Schema import DBSchema
 from Query.Operator import Operator
+from Storage.SlottedPage import SlottedPage
+from Utils.ExpressionCompiler import ExpressionCompiler
 
 
 class TableScan(Operator):
+    """
+    A table scan operator, returning the pages of a relation.
+
+    Scans may optionally filter and project their relation, given a predicate
+    expression and a list of attributes to keep. These are evaluated directly over
+    each page's packed tuples, and qualifying tuples are written to an in-memory
+    page, rather than to a temporary relation. The optimizer pushes selections and
+    attribute projections into scans in this way.
+    """
+
     def __init__(self, relId, schema, **kwargs):
         if relId and schema:
             super().__init__(**kwargs)
             self.relId = relId
             self.relSchema = schema
+            self.predicate = kwargs.get("predicate", None)
+            self.columns = None
+            self.useColumns(kwargs.get("columns", None))
         else:
             raise ValueError("Invalid relation name or schema for a table scan")
 
     # Returns the output schema of this operator
     def schema(self):
-        return self.relSchema
+        return self.outputSchema
+
+    # Adds a conjunct to the scan's predicate.
+    def addPredicate(self, predicate):
+        self.predicate = predicate if self.predicate is None \
+                           else "(" + self.predicate + ") and (" + predicate + ")"
+
+    # Restricts the scan's output to the given list of attributes,
+    # or all of the relation's attributes if None.
+    def useColumns(self, columns):
+        if columns is not None:
+            for f in columns:
+                if f not in self.relSchema.fields:
+                    raise ValueError("Invalid column for a table scan: " + str(f))
+            self.columns = list(columns)
+            self.outputSchema = DBSchema(self.relSchema.name, \
+                                         [(f, self.relSchema.types[self.relSchema.fields.index(f)]) for f in self.columns])
+        else:
+            self.columns = None
+            self.outputSchema = self.relSchema
+
+    # Returns whether this scan filters or projects its relation's pages.
+    def isFiltered(self):
+        return self.predicate is not None or self.columns is not None
 
     # Returns the relation accessed by this scan operator,
     # overriding the method in the parent class.
@@ -35,14 +75,25 @@ class TableScan(Operator):
     # Volcano-style iterator abstraction
     def __iter__(self):
         self.pageIterator = self.storage.pages(self.relId)
-        self.nextPageId, self.nextPage = None, None
+        self.outputPages = []
+        self.numOutputPages = 0
+        self.inputPageIndex = 0
         self.pageSize, self.numPages, _ = self.storage.relationStats(self.relId)
 
-        p = max(1, self.cardinality(False) / (self.pageSize * self.sampleFactor))
+        if self.isFiltered():
+            self.predicateFn = ExpressionCompiler.compileBinary(self.predicate, self.relSchema, globals()) \
+                                 if self.predicate else None
+            self.projectorFn = self.relSchema.projector(self.outputSchema) if self.columns is not None else None
+
+        p = max(1, self.relationCardinality() / (self.pageSize * self.sampleFactor))
         self.sampleSize = p if self.sampled else 0
         self.prevPageIndex, self.pagesToSample = (0, p)
         return self
 
+    # Rescans simply read the relation again, applying any predicate and projection.
+    def rescan(self):
+        return iter(self)
+
     # Table scans are always pipelined.
     # While this implementation is more verbose than necessary, it conveys
     # the page-oriented processing style of all operators.
@@ -57,6 +108,7 @@ class TableScan(Operator):
         while not (self.isOutputPageReady()):
             # Table scans in the storage engine return a pair of pageId and page
             pageId, page = next(self.pageIterator)
+            self.inputPageIndex = pageId.pageIndex
             self.processInputPage(pageId, page)
         return self.outputPage()
 
@@ -73,7 +125,7 @@ class TableScan(Operator):
             while pageId is None and page is None:
                 pr = self.pagesToSample / (1 + self.numPages - self.prevPageIndex)
                 pageId, page = self.nextOutput()
-                self.prevPageIndex = pageId.pageIndex
+                self.prevPageIndex = self.inputPageIndex
                 if pr >= random.random():
                     pageId, page = None, None
             self.pagesToSample -= 1
@@ -83,17 +135,40 @@ class TableScan(Operator):
 
     # Returns whether this operator has an output page ready for its iterator.
     def isOutputPageReady(self):
-        return not (self.nextPageId is None or self.nextPage is None)
+        return len(self.outputPages) > 0
 
     # Returns the next output page for this operator's iterator.
     def outputPage(self):
-        result, self.nextPageId, self.nextPage = (self.nextPageId, self.nextPage), None, None
-        return result
+        return self.outputPages.pop(0)
 
-    # Table scans simply pass along the next page.
+    # Table scans simply pass along the next page, unless filtering or projecting.
+    # Filtered scans write their qualifying tuples to pages held in memory. Projected
+    # tuples may be larger than input tuples, due to alignment padding in a reordered
+    # schema, in which case an input page may produce several output pages.
+    # Pages without any qualifying tuples are skipped.
     def processInputPage(self, pageId, page):
-        self.nextPageId = pageId
-        self.nextPage = page
+        if not self.isFiltered():
+            self.outputPages.append((pageId, page))
+            return
+
+        outputPage = None
+        numOutputs = 0
+
+        for inputTuple in page:
+            if self.predicateFn is None or self.predicateFn(inputTuple):
+                if outputPage is None or not outputPage.header.hasFreeTuple():
+                    outputPageId = PageId(FileId(-1 - self.id()), self.numOutputPages)
+                    self.numOutputPages += 1
+                    buffer = bytes(self.storage.bufferPool.pageSize)
+                    outputPage = SlottedPage(pageId=outputPageId, buffer=buffer, schema=self.outputSchema)
+                    self.outputPages.append((outputPageId, outputPage))
+                outputPage.insertTuple(self.projectorFn(inputTuple) if self.projectorFn else inputTuple)
+                numOutputs += 1
+
+        if self.sampled:
+            self.estimatedCardinality += numOutputs
+        else:
+            self.actualCardinality += numOutputs
 
     # Table scans do not need this method since they do not produce any new output.
     def emitOutputTuple(self, tupleData):
@@ -103,18 +178,30 @@ class TableScan(Operator):
 
     # Returns a single line description of the operator.
     def explain(self):
-        return super().explain() + "(" + self.relId + ")"
+        exprs = [self.relId,
+                 "predicate='" + self.predicate + "'" if self.predicate else None,
+                 "columns=" + str(self.columns) if self.columns is not None else None]
+        return super().explain() + "(" + ', '.join(filter(lambda x: x is not None, exprs)) + ")"
 
     # Returns the table's cardinality by using the storage engine.
+    # Scans with predicates instead return the number of tuples they produced.
     def cardinality(self, estimated):
+        if self.predicate:
+            return super().cardinality(estimated)
+        return self.relationCardinality()
+
+    def relationCardinality(self):
         _, _, r = self.storage.relationStats(self.relId)
         return r
 
     # Returns the table's cost as the product of the table cardinality,
     # and the per-tuple cost.
     def cost(self, estimated):
-        return self.cardinality(estimated) * self.tupleCost
+        return self.relationCardinality() * self.tupleCost
 
-    # A table scan returns a constant selectivity.
+    # A table scan returns a constant selectivity, unless it has a predicate.
     def selectivity(self, estimated):
+        if self.predicate:
+            r = self.relationCardinality()
+            return self.cardinality(estimated) / r if r else 1.0
         return 1.0
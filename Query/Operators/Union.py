@@ -38,14 +38,14 @@ class Union(Operator):
         self.inputIterators = [iter(self.lhsPlan), iter(self.rhsPlan)]
         self.inputsFinished = [False, False]
 
-        if not self.pipelined:
+        if not (self.pipelined or self.streaming):
             self.outputIterator = self.processAllPages()
 
         return self
 
     # Method used for iteration, doing work in the process. Handle pipelined and non-pipelined cases
     def __next__(self):
-        if self.pipelined:
+        if self.pipelined or self.streaming:
             while not (all(self.inputsFinished) or self.isOutputPageReady()):
 
                 # index of first unfinished input iterator
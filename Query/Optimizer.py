@@ -1,9 +1,11 @@
 import itertools
 
+from Catalog.Schema import DBSchema
 from Query.Plan import Plan
 from Query.Operators.Join import Join
 from Query.Operators.Project import Project
 from Query.Operators.Select import Select
+from Query.Operators.SelectProject import SelectProject
 from Utils.ExpressionInfo import ExpressionInfo
 
 # Helper for removing items from a tuple, while preserving order.
@@ -65,7 +67,7 @@ class Optimizer:
   def pushdownOperator(self, op):
     if op.operatorType() == "TableScan":
       return op
-    elif op.operatorType() in ["GroupBy", "Sort"]:
+    elif op.operatorType() in ["GroupBy", "Sort", "Limit"]:
       op.subPlan = self.pushdownOperator(op.subPlan)
       return op
     elif op.operatorType() == "UnionAll" or "Join" in op.operatorType():
@@ -84,7 +86,18 @@ class Optimizer:
     # First pushdown operators below:
     op.subPlan = self.pushdownOperator(op.subPlan)
 
-    if op.subPlan.operatorType() in ["GroupBy", "TableScan"]:
+    if op.subPlan.operatorType() == "TableScan":
+      # Restrict the scan to the projected attributes, if the projection neither renames
+      # nor computes any of them.
+      scanSchema = op.subPlan.schema()
+      isColumn = lambda k: op.projectExprs[k][0].strip() == k and k in scanSchema.fields \
+                             and scanSchema.types[scanSchema.fields.index(k)] == op.projectExprs[k][1]
+      if all(map(isColumn, op.projectExprs)):
+        op.subPlan.useColumns(list(op.projectExprs.keys()))
+        return op.subPlan
+      return op
+
+    elif op.subPlan.operatorType() in ["GroupBy", "Limit"]:
       return op
 
     elif op.subPlan.operatorType() == "Project":
@@ -151,7 +164,12 @@ class Optimizer:
     # First pushdown operators below:
     op.subPlan = self.pushdownOperator(op.subPlan)
 
-    if op.subPlan.operatorType() in ["GroupBy", "TableScan", "Project"]:
+    if op.subPlan.operatorType() == "TableScan":
+      # Evaluate the predicate within the scan itself.
+      op.subPlan.addPredicate(op.selectExpr)
+      return op.subPlan
+
+    elif op.subPlan.operatorType() in ["GroupBy", "Project", "Limit"]:
       return op
 
     elif op.subPlan.operatorType() == "Select":
@@ -222,6 +240,32 @@ class Optimizer:
       print("Unmatched operatorType in pushdownOperator(): " + op.operatorType())
       raise NotImplementedError
 
+  # Returns a plan where each projection over one or more selections is replaced by
+  # a single SelectProject operator, as are chains of selections. This avoids writing
+  # the selections' outputs to temporary relations.
+  def fuseOperators(self, plan):
+    return Plan(root=self.fuseOperator(plan.root))
+
+  def fuseOperator(self, op):
+    if op.operatorType() in ["Project", "Select"]:
+      projectExprs = op.projectExprs if op.operatorType() == "Project" else None
+      selectExprs = [op.selectExpr] if op.operatorType() == "Select" else []
+      subPlan = op.subPlan
+
+      while subPlan.operatorType() == "Select":
+        selectExprs.insert(0, subPlan.selectExpr)
+        subPlan = subPlan.subPlan
+
+      if subPlan is not op.subPlan:
+        selectExpr = ' and '.join(['(' + e + ')' for e in selectExprs])
+        op = SelectProject(subPlan, selectExpr, projectExprs)
+
+    for attr in ['subPlan', 'lhsPlan', 'rhsPlan']:
+      if getattr(op, attr, None) is not None:
+        setattr(op, attr, self.fuseOperator(getattr(op, attr)))
+
+    return op
+
   # Returns an optimized query plan with joins ordered via a System-R style
   # dyanmic programming algorithm. The plan cost should be compared with the
   # use of the cost model below.
@@ -286,13 +330,23 @@ class Optimizer:
         relevant_expr = 'True'
 
       # Construct a join plan for the current candidate, for each possible join algorithm.
-      # TODO: Evaluate more than just nested loop joins, and determine feasibility of those methods.
-      for algorithm in ["nested-loops", "block-nested-loops"]:
+      # Sort-merge joins are only feasible for equi-joins.
+      algorithms = [("nested-loops", {'expr': relevant_expr}),
+                    ("block-nested-loops", {'expr': relevant_expr})]
+
+      keySchemas = self.joinKeySchemas(relevant_expr, left.schema(), right.schema())
+      if keySchemas:
+        (lhsKeySchema, rhsKeySchema, residual_expr) = keySchemas
+        algorithms.append(("sort-merge", {'expr': residual_expr,
+                                          'lhsKeySchema': lhsKeySchema,
+                                          'rhsKeySchema': rhsKeySchema}))
+
+      for (algorithm, joinArgs) in algorithms:
         test_plan = Plan(root = Join(
           lhsPlan = left,
           rhsPlan = right,
           method = algorithm,
-          expr = relevant_expr
+          **joinArgs
         ))
 
         # Prepare and run the plan in sampling mode, and get the estimated cost.
@@ -309,13 +363,28 @@ class Optimizer:
     # table.
     return best_plan.root
 
+  # Returns the lhs and rhs key schemas for an equi-join expression over the given
+  # input schemas, along with any remaining join expression (or None if the equalities
+  # are the whole expression). Returns None if the expression has no equalities.
+  def joinKeySchemas(self, expr, lhsSchema, rhsSchema):
+    (pairs, complete) = ExpressionInfo(expr).equalityPairs(lhsSchema.fields, rhsSchema.fields)
+    if not pairs:
+      return None
+
+    typeOf = lambda schema, f: schema.types[schema.fields.index(f)]
+    lhsKeySchema = DBSchema(lhsSchema.name + "Key", [(l, typeOf(lhsSchema, l)) for (l, _) in pairs])
+    rhsKeySchema = DBSchema(rhsSchema.name + "Key", [(r, typeOf(rhsSchema, r)) for (_, r) in pairs])
+    return (lhsKeySchema, rhsKeySchema, None if complete else expr)
+
   # Optimize the given query plan, returning the resulting improved plan.
   # This should perform operation pushdown, followed by join order selection.
   def optimizeQuery(self, plan):
     pushedDown_plan = self.pushdownOperators(plan)
-    joinPicked_plan = self.pickJoinOrder(plan)
+    joinPicked_plan = self.pickJoinOrder(pushedDown_plan)
+    fused_plan = self.fuseOperators(joinPicked_plan)
+    fused_plan.prepare(self.db)
 
-    return joinPicked_plan
+    return fused_plan
 
 if __name__ == "__main__":
   import doctest
@@ -10,6 +10,7 @@ from Query.Operators.Union import Union
 from Query.Operators.Join import Join
 from Query.Operators.GroupBy import GroupBy
 from Query.Operators.Sort import Sort
+from Query.Operators.Limit import Limit
 
 
 class Plan:
@@ -306,6 +307,19 @@ class PlanBuilder:
       Sort[...,cost=...](sortKeyDesc='age')
         TableScan[...,cost=...](employee)
 
+    ### SELECT id FROM Employee ORDER by age DESC LIMIT 3 OFFSET 1
+    >>> query7a = db.query().fromTable('employee') \
+          .order(sortKeyFn=lambda x: x.age, sortKeyDesc='age', descending=True) \
+          .limit(3, offset=1).finalize()
+
+    >>> [query7a.schema().unpack(tup).id for page in db.processQuery(query7a) for tup in page[1]]
+    [18, 17, 16]
+
+    >>> print(query7a.explain()) # doctest: +ELLIPSIS
+    Limit[...,cost=...](limit=3, offset=1)
+      Sort[...,cost=...](sortKeyDesc='age', descending=True, topN=4)
+        TableScan[...,cost=...](employee)
+
     # Populate employees relation with another 10000 tuples
     >>> for tup in [schema.pack(schema.instantiate(i, math.ceil(random.gauss(45, 25)))) for i in range(10000)]:
     ...    _ = db.insertTuple(schema.name, tup)
@@ -342,15 +356,15 @@ class PlanBuilder:
             schema = self.database.relationSchema(relId)
             return PlanBuilder(operator=TableScan(relId, schema), db=self.database)
 
-    def where(self, conditionExpr):
+    def where(self, conditionExpr, **kwargs):
         if self.operator:
-            return PlanBuilder(operator=Select(self.operator, conditionExpr), db=self.database)
+            return PlanBuilder(operator=Select(self.operator, conditionExpr, **kwargs), db=self.database)
         else:
             raise ValueError("Invalid where clause")
 
-    def select(self, projectExprs):
+    def select(self, projectExprs, **kwargs):
         if self.operator:
-            return PlanBuilder(operator=Project(self.operator, projectExprs), db=self.database)
+            return PlanBuilder(operator=Project(self.operator, projectExprs, **kwargs), db=self.database)
         else:
             raise ValueError("Invalid select list")
 
@@ -381,6 +395,12 @@ class PlanBuilder:
         else:
             raise ValueError("Invalid order by operator")
 
+    def limit(self, limit, offset=0, **kwargs):
+        if self.operator:
+            return PlanBuilder(operator=Limit(self.operator, limit, offset, **kwargs), db=self.database)
+        else:
+            raise ValueError("Invalid limit clause")
+
     # Constructs a plan instance from the running plan tree.
     def finalize(self):
         if self.operator:
@@ -24,6 +24,15 @@ class BufferPool:
     >>> len(bp.pool.getbuffer()) == bp.poolSize
     True
 
+    # Grant pages to an operator, keeping some pages available
+    >>> bp.requestPages(bp.numPages(), reservePages=2) == bp.numPages() - 2
+    True
+    >>> bp.availablePages()
+    2
+    >>> bp.releasePages(bp.numPages() - 2)
+    >>> bp.availablePages() == bp.numPages()
+    True
+
     """
 
     defaultPoolSize = 128 * (1 << 20)
@@ -41,6 +50,8 @@ class BufferPool:
             self.pageMap = OrderedDict()
             self.freeList = list(range(0, self.poolSize, self.pageSize))
             self.freeListLen = len(self.freeList)
+            self.numPinnedPages = 0
+            self.numGrantedPages = 0
 
             self.fileMgr = None
 
@@ -51,6 +62,8 @@ class BufferPool:
         self.pageMap = other.pageMap
         self.freeList = other.freeList
         self.freeListLen = other.freeListLen
+        self.numPinnedPages = other.numPinnedPages
+        self.numGrantedPages = other.numGrantedPages
         self.fileMgr = other.fileMgr
 
     def setFileManager(self, fileMgr):
@@ -73,6 +86,27 @@ class BufferPool:
     def usedSpace(self):
         return self.size() - self.freeSpace()
 
+    # Memory grants
+    #
+    # Operators reserve pages for their in-memory state (e.g., join blocks or hash tables)
+    # by requesting a grant, and release it once done. Grants are only used for accounting:
+    # they limit the pages available to later requests, rather than the pages held in the pool.
+
+    # Returns the number of pages that are neither pinned nor granted.
+    def availablePages(self):
+        return max(0, self.numPages() - self.numPinnedPages - self.numGrantedPages)
+
+    # Grants up to numPages pages, while keeping reservePages available.
+    # Returns the number of pages granted, which may be zero.
+    def requestPages(self, numPages, reservePages=0):
+        granted = max(0, min(numPages, self.availablePages() - reservePages))
+        self.numGrantedPages += granted
+        return granted
+
+    # Returns previously granted pages.
+    def releasePages(self, numPages):
+        self.numGrantedPages = max(0, self.numGrantedPages - numPages)
+
     # Buffer pool operations
 
     def hasPage(self, pageId):
@@ -97,6 +131,7 @@ class BufferPool:
                 page = self.fileMgr.readPage(pageId, pageBuffer)
 
                 self.pageMap[pageId] = (offset, page, 1 if pinned else 0)
+                self.numPinnedPages += 1 if pinned else 0
                 self.pageMap.move_to_end(pageId)
                 return (page, False)
 
@@ -136,6 +171,7 @@ class BufferPool:
     def incrementPinCount(self, pageId, delta):
         (offset, page, pinCount) = self.pageMap[pageId]
         self.pageMap[pageId] = (offset, page, pinCount + delta)
+        self.numPinnedPages += (pinCount + delta > 0) - (pinCount > 0)
 
     # Removes a page from the page map, returning it to the free
     # page list without flushing the page to the disk.
@@ -237,6 +237,12 @@ class FileManager:
     if relId in self.relationFiles and self.indexManager:
       return self.indexManager.lookupByIndex(indexId, keyData)
 
+  # Perform index lookups for a sequence of keys in index order, with a single cursor.
+  # This returns an iterator over pairs of keys and lists of tuple ids.
+  def lookupKeysByIndex(self, relId, indexId, keys):
+    if relId in self.relationFiles and self.indexManager:
+      return self.indexManager.lookupKeysByIndex(indexId, keys)
+
   # Removes tuple(s) by key using the given index.
   # This should maintain all other indexes by retrieving the full tuple and tuple id,
   # and then using the deleteTuple method.
@@ -508,6 +508,25 @@ class IndexManager:
       crsr.close()
       return iter(result)
 
+  # Perform index lookups for a sequence of keys, reusing a single cursor.
+  # Keys should be in the index's (i.e., byte-wise) order, so that the cursor's
+  # accesses to the B-tree move forward. This yields a pair of the key and a list
+  # of tuple ids for each key.
+  def lookupKeysByIndex(self, indexId, keys):
+    indexDb = self.getIndex(indexId)
+    if indexDb is not None:
+      crsr = indexDb.cursor()
+      try:
+        for keyData in keys:
+          result = []
+          data = crsr.set(keyData)
+          while data and data[0] == keyData:
+            result.append(TupleId.unpack(data[1]))
+            data = crsr.next()
+          yield (keyData, result)
+      finally:
+        crsr.close()
+
   # Retrieve a tuple based on its key.
   # This method returns None if the relation does not have a primary index,
   # or if the key does not exist in the index.
@@ -449,6 +449,44 @@ class Page(BytesIO):
   def __iter__(self):
     return PageTupleIterator(self)
 
+  # Returns a list of buffer slices for all tuples in the page.
+  # Tuples in a contiguous page occupy the data area up to the free space offset.
+  def tupleViews(self):
+    if self.header:
+      size   = self.header.tupleSize
+      start  = self.header.dataOffset()
+      end    = self.header.freeSpaceOffset
+      buffer = self.getbuffer()
+      return [buffer[offset:offset+size] for offset in range(start, end - size + 1, size)]
+    return []
+
+  # Returns the (start, end) buffer offsets of each run of adjacent tuples.
+  # A contiguous page has at most one such run.
+  def tupleRuns(self):
+    if self.header and self.header.numTuples() > 0:
+      start = self.header.dataOffset()
+      return [(start, start + self.header.numTuples() * self.header.tupleSize)]
+    return []
+
+  # Returns a read-only NumPy structured array of the tuples in the page,
+  # using the data type given by the schema's numpyDtype() method.
+  # If the page's tuples are adjacent, this is a zero-copy view of the page buffer.
+  def asArray(self, schema):
+    import numpy as np
+    dtype  = schema.numpyDtype()
+    buffer = self.getbuffer()
+    arrays = [np.frombuffer(buffer[start:end], dtype=dtype) for (start, end) in self.tupleRuns()]
+
+    if len(arrays) == 1:
+      array = arrays[0]
+    elif arrays:
+      array = np.concatenate(arrays)
+    else:
+      array = np.empty(0, dtype=dtype)
+
+    array.flags.writeable = False
+    return array
+
   # Dirty bit accessors
   def isDirty(self):
     return self.header.isDirty()
@@ -84,6 +84,10 @@ class SlottedPageHeader(PageHeader):
   prefixFmt   = "H"
   prefixRepr  = struct.Struct(prefixFmt)
 
+  # The in-byte positions of the used slots for every possible bitvector byte,
+  # with the most significant bit as the first slot.
+  slotByteBits = tuple(tuple(j for j in range(8) if b & (0b1 << (7 - j))) for b in range(256))
+
   def __init__(self, **kwargs):
     other = kwargs.get("other", None)
     if other:
@@ -228,20 +232,18 @@ class SlottedPageHeader(PageHeader):
     return freeIndexes
 
   # Returns the slot indexes for all used slots.
+  # This decodes the bitvector a byte at a time through the slotByteBits table.
   def usedSlots(self):
     usedIndexes = []
-    for i in range(self.slots.nbytes-1):
-      for j in range(8):
-        if self.slots[i] & (0b1 << (7 - j)):
-          usedIndexes.append((i << 3) + j)
+    byteBits    = SlottedPageHeader.slotByteBits
+    for (i, b) in enumerate(self.slots):
+      if b:
+        base = i << 3
+        usedIndexes.extend([base + j for j in byteBits[b]])
 
-    # Special handling of the final byte to only consider up to numSlots.
-    i = self.slots.nbytes-1
-    j = 0
-    while (i << 3) + j < self.numSlots:
-      if self.slots[i] & (0b1 << (7 - j)):
-        usedIndexes.append((i << 3) + j)
-      j += 1
+    # Only consider up to numSlots in the final byte.
+    while usedIndexes and usedIndexes[-1] >= self.numSlots:
+      usedIndexes.pop()
 
     return usedIndexes
 
@@ -443,6 +445,10 @@ class SlottedPage(Page):
   >>> [schema.unpack(tup).age for tup in p]
   [28, 20, 22, 24, 26, 28, 30, 32, 34, 36, 38]
 
+  # Test whole-page tuple access
+  >>> [schema.unpack(tup).age for tup in p.tupleViews()] == [schema.unpack(tup).age for tup in p]
+  True
+
   # Test clearing of first tuple
   >>> tId = TupleId(p.pageId, 0)
   >>> sizeBeforeClear = p.header.usedSpace()
@@ -465,6 +471,15 @@ class SlottedPage(Page):
   >>> [schema.unpack(tup).age for tup in p]
   [20, 22, 24, 26, 28, 30, 32, 34, 36, 38]
 
+  >>> p.header.usedSlots()
+  [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+
+  # Test page-at-a-time decoding over the remaining run of slots
+  >>> len(p.tupleRuns())
+  1
+  >>> [e.age for e in schema.unpackPage(p)]
+  [20, 22, 24, 26, 28, 30, 32, 34, 36, 38]
+
   # Check that the page's slots have tracked the deletion.
   >>> p.header.usedSpace() == (sizeBeforeRemove - p.header.tupleSize)
   True
@@ -500,6 +515,39 @@ class SlottedPage(Page):
   def __iter__(self):
     return SlottedPageTupleIterator(self)
 
+  # Returns a list of buffer slices for all tuples in the page.
+  # This decodes the slot bitvector once, rather than checking each slot
+  # through getTuple as tuple ids would.
+  def tupleViews(self):
+    if self.header:
+      size   = self.header.tupleSize
+      start  = self.header.dataOffset()
+      end    = self.header.freeSpaceOffset
+      buffer = self.getbuffer()
+      views  = []
+      for slotIndex in self.header.usedSlots():
+        offset = start + size * slotIndex
+        if offset + size <= end:
+          views.append(buffer[offset:offset+size])
+      return views
+    return []
+
+  # Returns the (start, end) buffer offsets of each run of adjacent used slots.
+  def tupleRuns(self):
+    runs = []
+    if self.header:
+      size  = self.header.tupleSize
+      start = self.header.dataOffset()
+      end   = self.header.freeSpaceOffset
+      for slotIndex in self.header.usedSlots():
+        offset = start + size * slotIndex
+        if offset + size <= end:
+          if runs and runs[-1][1] == offset:
+            runs[-1] = (runs[-1][0], offset + size)
+          else:
+            runs.append((offset, offset + size))
+    return runs
+
   # Override contiguous page's deleteTuple to prevent it shifting data.
   def deleteTuple(self, tupleId):
     if self.header and tupleId:
@@ -510,29 +558,22 @@ class SlottedPage(Page):
 class SlottedPageTupleIterator(PageTupleIterator):
   """
   Iteration over the tuples in a slotted page.
+
+  The iterator takes a snapshot of the page's used slots on construction,
+  and then steps through the corresponding tuple buffer slices.
   """
   def __init__(self, page):
     if not isinstance(page, SlottedPage):
       raise ValueError("Invalid slotted page instance for a slotted page iterator")
     super().__init__(page)
+    self.tupleIterator = iter(page.tupleViews())
 
   def __iter__(self):
     return self
 
   # Tuple iterator
   def __next__(self):
-    (start, end) = (None, None)
-    while (start is None or end is None) and self.iterTupleIdx < self.page.header.maxTuples():
-      tId = TupleId(self.page.pageId, self.iterTupleIdx)
-      (start, end) = self.page.header.tupleRange(tId)
-      self.iterTupleIdx += 1
-
-    if start and end:
-      t = self.page.getTuple(tId)
-      if t:
-        return t
-
-    raise StopIteration
+    return next(self.tupleIterator)
 
 if __name__ == "__main__":
     import doctest
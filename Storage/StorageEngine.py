@@ -28,6 +28,10 @@ class StorageEngine:
   >>> [schema.unpack(tup).id for tup in storage.tuples(schema.name)] == list(range(20))
   True
 
+  # Test array-based table scan
+  >>> [a['age'][a['id'] < 5].tolist() for a in storage.scanArrays(schema.name)]
+  [[20, 22, 24, 26, 28]]
+
   """
 
   def __init__(self, **kwargs):
@@ -104,6 +108,21 @@ class StorageEngine:
     if self.fileMgr:
       return self.fileMgr.getIndex(indexId)
 
+  # Index lookups for a sequence of keys, in the index's key order.
+  # This returns an iterator over pairs of keys and lists of tuple ids.
+  def lookupKeysByIndex(self, relId, indexId, keys):
+    if self.fileMgr:
+      return self.fileMgr.lookupKeysByIndex(relId, indexId, keys)
+    else:
+      raise ValueError("Could not perform index lookup, no file manager found")
+
+  # Returns the data of the given tuple, accessing its page through the buffer pool.
+  def getTuple(self, tupleId):
+    if self.fileMgr:
+      return bytes(self.bufferPool.getPage(tupleId.pageId).getTuple(tupleId))
+    else:
+      raise ValueError("Could not get tuple, no file manager found")
+
 
   # Data manipulation operations
 
@@ -136,6 +155,15 @@ class StorageEngine:
     if self.fileMgr:
       return self.fileMgr.pages(relId)
 
+  # Array-based table scan, yielding the tuples of each page
+  # as a NumPy structured array (see Page.asArray).
+  def scanArrays(self, relId):
+    if self.fileMgr:
+      (_, rFile) = self.fileMgr.relationFile(relId)
+      if rFile:
+        schema = rFile.schema()
+        return (page.asArray(schema) for (_, page) in rFile.pages())
+
 
 if __name__ == "__main__":
     import doctest
@@ -1,8 +1,11 @@
 import Database
 from Catalog.Schema import DBSchema
 
+import shutil
 import sys
+import tempfile
 import unittest
+from unittest import mock
 
 import warnings
 
@@ -50,6 +53,130 @@ class Hw2PublicTests(unittest.TestCase):
         results = self.getResults(project)
         self.assertEqual([x.id for x in results], [x for x in range(self.numEmployees)])
 
+    def testVectorizedProject(self):
+        # Returns the results of a projection, or the type of error it raised.
+        def project(projectExprs, vectorized):
+            query = self.db.query().fromTable('employee').select(projectExprs, vectorized=vectorized).finalize()
+            try:
+                return [tuple(x) for x in self.getResults(query)]
+            except Exception as e:
+                return type(e)
+
+        valid = {'id': ('id', 'int'), 'halfAge': ('age / 2', 'double'), 'nextAge': ('age + dept_id', 'short')}
+        self.assertEqual(project(valid, True), [(i, i + 10.0, 2 * i + 20 + i % 2) for i in range(self.numEmployees)])
+
+        # Results that cannot be stored exactly fall back to row-wise evaluation, and raise its errors.
+        invalid = [{'ratio': ('age / dept_id', 'double')}, \
+                   {'scaledAge': ('age * 1.5', 'int')}, \
+                   {'scaledAge': ('age * 3000000000', 'int')}]
+        for projectExprs in [valid] + invalid:
+            self.assertEqual(project(projectExprs, True), project(projectExprs, False))
+        for projectExprs in invalid:
+            self.assertTrue(isinstance(project(projectExprs, True), type))
+
+    def testExecute(self):
+        select = self.db.query().fromTable('employee').where('age < 30').finalize()
+        results = self.db.execute(select)
+        self.assertEqual([x.age for x in results], [20, 22, 24, 26, 28])
+
+        project = self.db.query().fromTable('employee').select({'id': ('id', 'int')}).finalize()
+        batches = list(self.db.execute(project, batchSize=8))
+        self.assertEqual([len(b) for b in batches], [8, 8, 4])
+        self.assertEqual([x.id for b in batches for x in b], [x for x in range(self.numEmployees)])
+
+        # Executing a plan, fully or partially, leaves its streaming mode unchanged.
+        self.assertFalse(any(op.streaming for (_, op) in select.flatten()))
+        results = self.db.execute(select)
+        self.assertEqual(next(results).age, 20)
+        self.assertTrue(select.root.streaming)
+        results.close()
+        self.assertFalse(any(op.streaming for (_, op) in select.flatten()))
+        self.assertEqual([x.age for x in self.getResults(select)], [20, 22, 24, 26, 28])
+
+    def testFilteredScan(self):
+        # SELECT id FROM Employee WHERE dept_id == 1 AND age < 40, evaluated within the scan
+        scan = self.db.query().fromTable('employee').finalize()
+        scan.root.addPredicate('dept_id == 1')
+        scan.root.addPredicate('age < 40')
+        scan.root.useColumns(['id'])
+        self.assertEqual(scan.root.predicate, '(dept_id == 1) and (age < 40)')
+        self.assertEqual(scan.schema().fields, ['id'])
+        self.assertRaises(ValueError, scan.root.useColumns, ['salary'])
+
+        results = self.getResults(scan)
+        self.assertEqual([x.id for x in results], [1, 3, 5, 7, 9])
+        self.assertEqual(scan.root.cardinality(False), 5)
+
+        # Sampled scans count their qualifying tuples. Every page is sampled here.
+        with mock.patch('random.random', return_value=1.0):
+            self.assertEqual(scan.sample(1.0), 5)
+        self.assertEqual(scan.root.cardinality(True), 5)
+
+    def testScanPushdown(self):
+        # SELECT id, dept_id FROM Employee WHERE age < 40
+        query = lambda: self.db.query().fromTable('employee').where('age < 40').select( \
+            {'id': ('id', 'int'), 'dept_id': ('dept_id', 'int')}).finalize()
+        pushedDown = self.db.queryOptimizer().pushdownOperators(query())
+        self.assertEqual(pushedDown.root.operatorType(), 'TableScan')
+        self.assertEqual(pushedDown.root.predicate, 'age < 40')
+        self.assertEqual(pushedDown.root.columns, ['id', 'dept_id'])
+
+        # Computed projections remain above the filtered scan.
+        computed = self.db.query().fromTable('employee').where('age < 40').select( \
+            {'nextAge': ('age + 1', 'int')}).finalize()
+        pushedDown = self.db.queryOptimizer().pushdownOperators(computed)
+        self.assertEqual(pushedDown.root.operatorType(), 'Project')
+        self.assertEqual(pushedDown.root.subPlan.operatorType(), 'TableScan')
+        self.assertEqual(pushedDown.root.subPlan.predicate, 'age < 40')
+        self.assertEqual(pushedDown.root.subPlan.columns, None)
+
+        # Optimized and unoptimized plans produce the same results.
+        optimized = self.db.queryOptimizer().optimizeQuery(query())
+        self.assertEqual(optimized.root.operatorType(), 'TableScan')
+        expected = [tuple(x) for x in self.getResults(query())]
+        self.assertEqual(expected, [(i, i % 2) for i in range(10)])
+        self.assertEqual([tuple(x) for x in self.getResults(optimized)], expected)
+
+    def testScanPushdownPadding(self):
+        # Reordering the attributes of a scan may add alignment padding to its tuples,
+        # so that a projected page no longer fits in a single output page.
+        self.db.createRelation('emp', [('id', 'int'), ('name', 'char(9)')])
+        empSchema = self.db.relationSchema('emp')
+        numEmps = 2000
+        for i in range(numEmps):
+            self.db.insertTuple('emp', empSchema.pack(empSchema.instantiate(i, 'emp' + str(i))))
+
+        query = lambda: self.db.query().fromTable('emp').select( \
+            {'name': ('name', 'char(9)'), 'id': ('id', 'int')}).finalize()
+        optimized = self.db.queryOptimizer().optimizeQuery(query())
+        self.assertEqual(optimized.root.operatorType(), 'TableScan')
+        self.assertGreater(optimized.schema().size, empSchema.size)
+
+        expected = [tuple(x) for x in self.getResults(query())]
+        self.assertEqual(expected, [('emp' + str(i), i) for i in range(numEmps)])
+        self.assertEqual([tuple(x) for x in self.getResults(optimized)], expected)
+        self.db.removeRelation('emp')
+
+    def testSelectProject(self):
+        # SELECT id AS a, id AS b, age FROM Employee WHERE age < 30, fused into a single operator
+        query = self.db.query().fromTable('employee').where('age < 30').select( \
+            {'a': ('id', 'int'), 'b': ('id', 'int'), 'age': ('age', 'int')}).finalize()
+        expected = [tuple(x) for x in self.getResults(query)]
+
+        fused = self.db.queryOptimizer().fuseOperators(query).prepare(self.db)
+        self.assertEqual(fused.root.operatorType(), 'SelectProject')
+        self.assertEqual(fused.root.subPlan.operatorType(), 'TableScan')
+        results = [tuple(x) for x in self.getResults(fused)]
+        self.assertEqual(results, [(i, i, 2 * i + 20) for i in range(5)])
+        self.assertEqual(results, expected)
+
+        # Projections over computed expressions are compiled rather than copied.
+        project = self.db.query().fromTable('employee').where('age < 30').where('dept_id == 1').select( \
+            {'id': ('id', 'int'), 'nextAge': ('age + 1', 'int')}).finalize()
+        fused = self.db.queryOptimizer().fuseOperators(project).prepare(self.db)
+        self.assertEqual(fused.root.selectExpr, '(age < 30) and (dept_id == 1)')
+        self.assertEqual([tuple(x) for x in self.getResults(fused)], [(1, 23), (3, 27)])
+
     def testNLJoin(self):
         schema = self.db.relationSchema('employee')
         e2schema = schema.rename('employee2', {'id': 'id2', 'age': 'age2', 'dept_id': 'dept_id2'})
@@ -91,6 +218,33 @@ class Hw2PublicTests(unittest.TestCase):
         results = self.getResults(join)
         self.assertEqual(len(results), 0.5 * self.numEmployees * (self.numEmployees + 1))
 
+    def testNestedBNLJoin(self):
+        schema = self.db.relationSchema('employee')
+        e2schema = schema.rename('employee2', {'id': 'id2', 'age': 'age2', 'dept_id': 'dept_id2'})
+        e3schema = schema.rename('employee3', {'id': 'id3', 'age': 'age3', 'dept_id': 'dept_id3'})
+        join = self.db.query().fromTable('employee').join( \
+            self.db.query().fromTable('employee'), \
+            rhsSchema=e2schema, \
+            method='block-nested-loops', \
+            expr='id == id2' \
+            ).join( \
+            self.db.query().fromTable('employee'), \
+            rhsSchema=e3schema, \
+            method='block-nested-loops', \
+            expr='id2 == id3' \
+            ).finalize()
+        results = self.getResults(join)
+        self.assertEqual(len(results), self.numEmployees)
+
+        # Both joins receive a share of the buffer pool for their blocks.
+        outer, inner = join.root, join.root.lhsPlan
+        bufPool = self.db.storageEngine().bufferPool
+        self.assertEqual(outer.memoryConsumers(), 2)
+        self.assertGreater(inner.blockSize, 1)
+        self.assertLessEqual(abs(outer.blockSize - inner.blockSize), outer.reservePages)
+        self.assertLessEqual(outer.blockSize + inner.blockSize, bufPool.numPages())
+        self.assertEqual(bufPool.numGrantedPages, 0)
+
     def testGroupBy(self):
         # SELECT id, min(age), max(age) FROM Employee GROUP BY (id % 2)
         aggMinMaxSchema = DBSchema('minmax', [('minAge', 'int'), ('maxAge', 'int')])
@@ -113,6 +267,72 @@ class Hw2PublicTests(unittest.TestCase):
                 self.assertEqual(result.minAge, 22)
                 self.assertEqual(result.maxAge, 58)
 
+    def testVectorizedGroupBy(self):
+        # SELECT dept_id, count(*), min(age), avg(age) FROM Employee GROUP BY dept_id
+        aggSchema = DBSchema('aggs', [('numEmployees', 'int'), ('minAge', 'int'), ('avgAge', 'double')])
+        keySchema = DBSchema('employeeKey', [('dept_id', 'int')])
+        for vectorized in [False, True]:
+            groupBy = self.db.query().fromTable('employee').groupBy( \
+                groupSchema=keySchema, \
+                aggSchema=aggSchema, \
+                groupExpr='dept_id', \
+                aggExprs=[('count',), ('min', 'age'), ('avg', 'age')], \
+                groupHashFn=(lambda gbVal: hash(gbVal[0]) % 2), \
+                vectorized=vectorized \
+                ).finalize()
+            self.assertEqual(groupBy.root.vectorizedGroupFn() is not None, vectorized)
+            results = sorted(tuple(x) for x in self.getResults(groupBy))
+            self.assertEqual(results, [(0, 10, 20, 38.0), (1, 10, 22, 40.0)])
+
+    def testSortedGroupBy(self):
+        # SELECT dept_id, count(*) FROM Employee GROUP BY dept_id, over an input ordered by dept_id
+        aggCountSchema = DBSchema('count', [('numEmployees', 'int')])
+        keySchema = DBSchema('employeeKey', [('dept_id', 'int')])
+        deptId = lambda e: e.dept_id
+        groupBy = self.db.query().fromTable('employee').order( \
+            sortKeyFn=deptId, \
+            sortKeyDesc='dept_id' \
+            ).groupBy( \
+            groupSchema=keySchema, \
+            aggSchema=aggCountSchema, \
+            groupExpr=deptId, \
+            aggExprs=[(0, lambda acc, e: acc + 1, lambda x: x)], \
+            groupHashFn=(lambda gbVal: hash(gbVal[0]) % 2) \
+            ).finalize()
+        self.assertTrue(groupBy.root.isInputGrouped())
+        results = self.getResults(groupBy)
+        self.assertEqual([(x.dept_id, x.numEmployees) for x in results], [(0, 10), (1, 10)])
+
+        # Sorts on the group attributes are recognized by their key, through selections and
+        # projections keeping the group attributes. Other sorts and projections are hash aggregated.
+        def sortedGroupBy(sortKeyFn, sortKeyDesc, projectExprs=None, groupExpr='dept_id'):
+            query = self.db.query().fromTable('employee').order(sortKeyFn=sortKeyFn, sortKeyDesc=sortKeyDesc)
+            query = query.where('age < 36')
+            if projectExprs:
+                query = query.select(projectExprs)
+            return query.groupBy( \
+                groupSchema=keySchema, \
+                aggSchema=aggCountSchema, \
+                groupExpr=groupExpr, \
+                aggExprs=[('count',)], \
+                groupHashFn=(lambda gbVal: hash(gbVal[0]) % 2) \
+                ).finalize()
+
+        keepDeptId = {'dept_id': ('dept_id', 'int'), 'age': ('age', 'int')}
+        renameDeptId = {'dept_id': ('id % 2', 'int'), 'age': ('age', 'int')}
+        plans = [(sortedGroupBy(lambda e: e.dept_id, 'dept_id', groupExpr=(lambda e: e.dept_id)), True),
+                 (sortedGroupBy('dept_id, age', 'dept_id, age'), True),
+                 (sortedGroupBy(lambda e: (e.dept_id, e.age), 'dept_id, age', keepDeptId), True),
+                 (sortedGroupBy('age, dept_id', 'age, dept_id'), False),
+                 (sortedGroupBy(lambda e: e.dept_id, 'dept_id', renameDeptId), False),
+                 (sortedGroupBy(lambda e: e.dept_id % 2, 'dept_id % 2'), False)]
+
+        for (plan, grouped) in plans:
+            self.assertEqual(plan.root.isInputGrouped(), grouped)
+            self.assertEqual(plan.root.requestsMemory(), not grouped)
+            results = self.getResults(plan)
+            self.assertEqual(sorted((x.dept_id, x.numEmployees) for x in results), [(0, 4), (1, 4)])
+
     def testHashJoin(self):
         schema = self.db.relationSchema('employee')
         e2schema = schema.rename('employee2', {'id': 'id2', 'age': 'age2', 'dept_id': 'dept_id2'})
@@ -128,15 +348,65 @@ class Hw2PublicTests(unittest.TestCase):
         results = self.getResults(hashJoin)
         self.assertEqual(len(results), self.numEmployees)
 
+    def testSortMergeJoin(self):
+        schema = self.db.relationSchema('employee')
+        e2schema = schema.rename('employee2', {'id': 'id2', 'age': 'age2', 'dept_id': 'dept_id2'})
+        keySchema = DBSchema('employeeKey', [('dept_id', 'int')])
+        keySchema2 = DBSchema('employeeKey2', [('dept_id2', 'int')])
+        join = self.db.query().fromTable('employee').join( \
+            self.db.query().fromTable('employee'), \
+            rhsSchema=e2schema, \
+            method='sort-merge', \
+            lhsKeySchema=keySchema, rhsKeySchema=keySchema2, \
+            expr='id < id2' \
+            ).finalize()
+        results = self.getResults(join)
+        # Employees are in department 0 or 1, with ids alternating between them.
+        self.assertEqual(len(results), 2 * sum(range(self.numEmployees // 2)))
+        self.assertTrue(all(x.dept_id == x.dept_id2 and x.id < x.id2 for x in results))
+
     def testSort(self):
         sort = self.db.query().fromTable('employee').order( \
             sortKeyFn=lambda x: x.age,
-            sortKeyDesc='age'
+            sortKeyDesc='age',
+            descending=True
         ).finalize()
         results = self.getResults(sort)
         self.assertEqual(len(results), self.numEmployees)
         self.assertEqual([x.id for x in results], [(self.numEmployees - x - 1) for x in range(self.numEmployees)])
 
+    def testLimit(self):
+        limit = self.db.query().fromTable('employee').where('age > 30').limit(3, offset=2).finalize()
+        results = self.getResults(limit)
+        self.assertEqual([x.id for x in results], [8, 9, 10])
+
+        topN = self.db.query().fromTable('employee').order( \
+            sortKeyFn=lambda x: x.age,
+            sortKeyDesc='age',
+            descending=True
+        ).limit(5).finalize()
+        results = self.getResults(topN)
+        self.assertEqual([x.id for x in results], [(self.numEmployees - x - 1) for x in range(5)])
+
+        # Projections above the sort still let it keep only its top tuples, but selections do not.
+        projectTopN = self.db.query().fromTable('employee').order( \
+            sortKeyFn=lambda x: x.age,
+            sortKeyDesc='age',
+            descending=True
+        ).select({'id': ('id', 'int')}).limit(5).finalize()
+        results = self.getResults(projectTopN)
+        self.assertEqual([x.id for x in results], [(self.numEmployees - x - 1) for x in range(5)])
+        self.assertEqual(projectTopN.root.subPlan.subPlan.topN, 5)
+
+        selectSorted = self.db.query().fromTable('employee').order( \
+            sortKeyFn=lambda x: x.age,
+            sortKeyDesc='age',
+            descending=True
+        ).where('dept_id == 0').limit(5).finalize()
+        results = self.getResults(selectSorted)
+        self.assertEqual([x.id for x in results], [(self.numEmployees - 2 * x - 2) for x in range(5)])
+        self.assertIsNone(selectSorted.root.subPlan.subPlan.topN)
+
     def testIndexJoin(self):
         schema = self.db.relationSchema('employee')
         e2schema = schema.rename('employee2', {'id': 'id2', 'age': 'age2', 'dept_id': 'dept_id2'})
@@ -153,5 +423,140 @@ class Hw2PublicTests(unittest.TestCase):
         self.assertEqual(len(results), self.numEmployees)
 
 
+
+class Hw2SmallPoolTests(unittest.TestCase):
+    # Utilities
+    def setUp(self):
+        warnings.simplefilter("ignore", ResourceWarning)
+
+        # Start with a database whose buffer pool only holds a few pages, so that
+        # operators spill their inputs to temporary relations.
+        self.dataDir = tempfile.mkdtemp()
+        self.db = Database.Database(dataDir=self.dataDir, pageSize=4096, poolSize=6 * 4096)
+        self.db.createRelation('orders', [('okey', 'int'), ('odata', 'char(60)')])
+        self.db.createRelation('lineitem', [('lkey', 'int'), ('lnum', 'int')])
+
+        self.numOrders = 3000
+        self.numLineitems = 6000
+        ordSchema = self.db.relationSchema('orders')
+        lineSchema = self.db.relationSchema('lineitem')
+
+        for i in range(self.numOrders):
+            self.db.insertTuple('orders', ordSchema.pack(ordSchema.instantiate(i, 'order' + str(i))))
+        for i in range(self.numLineitems):
+            self.db.insertTuple('lineitem', lineSchema.pack(lineSchema.instantiate((7 * i) % self.numOrders, i)))
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.dataDir)
+
+    def getResults(self, query):
+        return [query.schema().unpack(tup) for page in self.db.processQuery(query) for tup in page[1]]
+
+    # Checks that queries released their memory grants and pinned pages, and removed
+    # any temporary relations other than their operators' outputs.
+    def assertNoResourcesHeld(self, *queries):
+        bufPool = self.db.storageEngine().bufferPool
+        self.assertEqual(bufPool.numGrantedPages, 0)
+        self.assertEqual(bufPool.numPinnedPages, 0)
+        relations = set(['orders', 'lineitem'] + [op.relationId() for q in queries for (_, op) in q.flatten()])
+        self.assertEqual(set(self.db.storageEngine().relations()) - relations, set())
+
+    # Operator test cases
+    def testHashJoinSpill(self):
+        # The orders do not fit in the buffer pool, and their partitions are repartitioned.
+        hashJoin = self.db.query().fromTable('orders').join( \
+            self.db.query().fromTable('lineitem'), \
+            method='hash', \
+            lhsHashFn='hash(okey) % 4', lhsKeySchema=DBSchema('ordersKey', [('okey', 'int')]), \
+            rhsHashFn='hash(lkey) % 4', rhsKeySchema=DBSchema('lineitemKey', [('lkey', 'int')]), \
+            ).finalize()
+        results = self.getResults(hashJoin)
+        self.assertEqual(sorted((x.okey, x.lnum) for x in results), \
+                         sorted(((7 * i) % self.numOrders, i) for i in range(self.numLineitems)))
+        self.assertTrue(all(x.odata == 'order' + str(x.okey) for x in results))
+        self.assertGreater(hashJoin.root.spillBytes, 0)
+        self.assertGreater(hashJoin.root.partitionDepth, 1)
+        self.assertNoResourcesHeld(hashJoin)
+
+
+    def testSortMergeJoinSpill(self):
+        # Both inputs are sorted externally.
+        join = self.db.query().fromTable('orders').join( \
+            self.db.query().fromTable('lineitem'), \
+            method='sort-merge', \
+            lhsKeySchema=DBSchema('ordersKey', [('okey', 'int')]), \
+            rhsKeySchema=DBSchema('lineitemKey', [('lkey', 'int')]), \
+            ).finalize()
+        results = self.getResults(join)
+        self.assertEqual([(x.okey, x.lnum) for x in results], \
+                         sorted(((7 * i) % self.numOrders, i) for i in range(self.numLineitems)))
+        # Orders are stored in key order, and form a single run.
+        self.assertEqual([sort.numRuns > 1 for sort in join.root.inputSorts], [False, True])
+        self.assertNoResourcesHeld(join)
+
+    def testGroupBySpill(self):
+        # SELECT okey, count(*) FROM Orders GROUP BY okey, with more groups than fit in memory
+        aggSchema = DBSchema('ordersCount', [('numOrders', 'int')])
+        keySchema = DBSchema('ordersKey', [('okey', 'int')])
+        groupBy = self.db.query().fromTable('orders').groupBy( \
+            groupSchema=keySchema, \
+            aggSchema=aggSchema, \
+            groupExpr=(lambda e: e.okey), \
+            aggExprs=[(0, lambda acc, e: acc + 1, lambda x: x)], \
+            groupHashFn=(lambda gbVal: hash(gbVal[0]) % 4) \
+            ).finalize()
+        results = self.getResults(groupBy)
+
+        # Every group is output exactly once.
+        self.assertEqual(sorted(x.okey for x in results), list(range(self.numOrders)))
+        self.assertTrue(all(x.numOrders == 1 for x in results))
+        self.assertGreater(groupBy.root.spillBytes, 0)
+        self.assertNoResourcesHeld(groupBy)
+
+    def testLimitEarlyTermination(self):
+        # SELECT * FROM Orders WHERE okey % 2 == 0 LIMIT 5, processed without streaming.
+        # The selection only reads the orders needed to produce the limit's tuples.
+        limit = self.db.query().fromTable('orders').where('okey % 2 == 0').limit(5).finalize()
+        self.assertFalse(limit.root.streaming)
+        results = self.getResults(limit)
+        self.assertEqual([x.okey for x in results], [0, 2, 4, 6, 8])
+        self.assertLess(limit.root.subPlan.actualCardinality, self.numOrders // 2)
+        self.assertNoResourcesHeld(limit)
+
+        # A limit over a join stops probing once it has its tuples.
+        join = self.db.query().fromTable('lineitem').join( \
+            self.db.query().fromTable('orders'), \
+            method='hash', \
+            lhsHashFn='hash(lkey) % 4', lhsKeySchema=DBSchema('lineitemKey', [('lkey', 'int')]), \
+            rhsHashFn='hash(okey) % 4', rhsKeySchema=DBSchema('ordersKey', [('okey', 'int')]), \
+            ).limit(10).finalize()
+        results = self.getResults(join)
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(x.lkey == x.okey for x in results))
+        self.assertLess(join.root.subPlan.actualCardinality, self.numLineitems)
+        self.assertNoResourcesHeld(limit, join)
+
+        # Limits over external sorts and spilling group-bys release their runs and partitions.
+        sort = self.db.query().fromTable('lineitem').order( \
+            sortKeyFn=lambda x: x.lkey,
+            sortKeyDesc='lkey'
+        ).where('lnum % 2 == 0').limit(5).finalize()
+        results = self.getResults(sort)
+        self.assertEqual([x.lkey for x in results], [0, 0, 2, 2, 4])
+        self.assertGreater(sort.root.subPlan.subPlan.numRuns, 1)
+        self.assertNoResourcesHeld(limit, join, sort)
+
+        groupBy = self.db.query().fromTable('orders').groupBy( \
+            groupSchema=DBSchema('ordersKey', [('okey', 'int')]), \
+            aggSchema=DBSchema('ordersCount', [('numOrders', 'int')]), \
+            groupExpr=(lambda e: e.okey), \
+            aggExprs=[(0, lambda acc, e: acc + 1, lambda x: x)], \
+            groupHashFn=(lambda gbVal: hash(gbVal[0]) % 4) \
+            ).limit(5).finalize()
+        results = self.getResults(groupBy)
+        self.assertEqual(len(results), 5)
+        self.assertNoResourcesHeld(limit, join, sort, groupBy)
+
 if __name__ == '__main__':
     unittest.main(argv=[sys.argv[0], '-v'])
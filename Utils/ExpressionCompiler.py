@@ -0,0 +1,281 @@
+import ast
+from struct import Struct
+
+from Catalog.Schema import Types
+from Utils.ExpressionInfo import ExpressionInfo
+
+# Compiles query expressions into Python functions over positional tuple fields.
+class ExpressionCompiler:
+  """
+  Query expressions (e.g., where-clauses, select lists, join expressions and
+  hash functions) are strings over the attribute names of an operator's inputs.
+  Rather than evaluating these strings once per tuple, we compile each one into
+  a function taking one tuple per input schema, which binds only the fields
+  referenced by the expression from their positions in the tuple.
+
+  Compiled code is cached by the expression and the fields of its inputs,
+  so operators can request their functions on every page at little cost.
+
+  >>> from Catalog.Schema import DBSchema
+  >>> schema = DBSchema('employee', [('id', 'int'), ('age', 'int')])
+  >>> schema2 = DBSchema('employee2', [('id2', 'int'), ('age2', 'int')])
+
+  >>> predicate = ExpressionCompiler.compile('age < 30', [schema])
+  >>> predicate(schema.instantiate(1, 25)), predicate((2, 45))
+  (True, False)
+
+  >>> joinPredicate = ExpressionCompiler.compile('id == id2 and age < age2', [schema, schema2])
+  >>> joinPredicate((1, 25), (1, 30)), joinPredicate((1, 25), (2, 30))
+  (True, False)
+
+  >>> projection = ExpressionCompiler.compileProjection(['id', 'age * 2'], [schema])
+  >>> projection(schema.instantiate(1, 25))
+  (1, 50)
+
+  Expressions can also be compiled to take a single packed tuple. These functions
+  decode only the fields referenced by the expression, directly from the tuple's bytes.
+
+  >>> packedPredicate = ExpressionCompiler.compileBinary('age < 30', schema)
+  >>> packedPredicate(schema.pack(schema.instantiate(1, 25)))
+  True
+
+  Expressions over a single schema's numeric attributes can also be compiled
+  into NumPy column expressions, which evaluate a page's worth of tuples at once.
+  These functions take a structured array, as returned by Page.asArray, and
+  produce a boolean mask for predicates, or a tuple of columns for projections.
+  Unsupported expressions (e.g., those with calls or character sequences) compile
+  to None, and should be evaluated a tuple at a time instead.
+
+  >>> import numpy as np
+  >>> batch = np.array([(1, 25), (2, 45), (3, 35)], dtype=schema.numpyDtype())
+  >>> ExpressionCompiler.compileVectorized('not id == 2 and 20 < age < 40', schema)(batch)
+  array([ True, False,  True])
+  >>> [c.tolist() for c in ExpressionCompiler.compileVectorizedProjection(['id', 'age * 2'], schema)(batch)]
+  [[1, 2, 3], [50, 90, 70]]
+  >>> ExpressionCompiler.compileVectorized('hash(id) % 2 == 0', schema) is None
+  True
+  """
+
+  # Compiled code objects, by expression and input schema fields.
+  cache = {}
+
+  # Returns a function evaluating the given expression over one tuple per input schema.
+  # Any names other than attributes are resolved in the 'env' dictionary of globals,
+  # as with eval.
+  @classmethod
+  def compile(cls, expr, schemas, env=None):
+    return cls.compileFunction("(" + expr + ")", schemas, env)
+
+  # Returns a function evaluating a list of expressions over one tuple per input schema,
+  # returning their values as a tuple.
+  @classmethod
+  def compileProjection(cls, exprs, schemas, env=None):
+    return cls.compileFunction("(" + ''.join(["(" + e + "), " for e in exprs]) + ")", schemas, env)
+
+  @classmethod
+  def compileFunction(cls, body, schemas, env):
+    key = (body, tuple([tuple(schema.fields) for schema in schemas]))
+    if key not in cls.cache:
+      names = ExpressionInfo(body).getAttributes()
+      args = ['row' + str(i) for i in range(len(schemas))]
+
+      source = ["def expression(" + ', '.join(args) + "):"]
+      for (arg, schema) in zip(args, schemas):
+        for (i, field) in enumerate(schema.fields):
+          if field in names:
+            source.append("  " + field + " = " + arg + "[" + str(i) + "]")
+      source.append("  return " + body)
+
+      cls.cache[key] = compile('\n'.join(source), '<expression>', 'exec')
+
+    # Define the function in a separate namespace, to leave the globals unchanged.
+    namespace = {}
+    exec(cls.cache[key], env if env is not None else {}, namespace)
+    return namespace['expression']
+
+  # Compiled code objects over packed tuples, by expression and input schema.
+  binaryCache = {}
+
+  # Returns a function evaluating the given expression over a packed tuple of the given schema.
+  @classmethod
+  def compileBinary(cls, expr, schema, env=None):
+    return cls.compileBinaryFunction("(" + expr + ")", schema, env)
+
+  # Returns a function evaluating a list of expressions over a packed tuple of the given
+  # schema, returning their values as a tuple.
+  @classmethod
+  def compileBinaryProjection(cls, exprs, schema, env=None):
+    return cls.compileBinaryFunction("(" + ''.join(["(" + e + "), " for e in exprs]) + ")", schema, env)
+
+  # Generates a factory for the function, which binds a single-field struct
+  # for each referenced field as a closure variable.
+  @classmethod
+  def compileBinaryFunction(cls, body, schema, env):
+    key = (body, tuple(schema.schema()))
+    names = ExpressionInfo(body).getAttributes()
+    fields = [i for (i, f) in enumerate(schema.fields) if f in names]
+
+    if key not in cls.binaryCache:
+      source = ["def factory(" + ''.join(["unpack" + str(i) + ", " for i in fields]) + "padding):",
+                "  def expression(row0):"]
+      for i in fields:
+        decode = ".decode().rstrip(padding)" if i in schema.stringFields else ""
+        source.append("    " + schema.fields[i] + " = unpack" + str(i)
+                      + "(row0, " + str(schema.offsets[i]) + ")[0]" + decode)
+      source += ["    return " + body,
+                 "  return expression"]
+
+      cls.binaryCache[key] = compile('\n'.join(source), '<expression>', 'exec')
+
+    namespace = {}
+    exec(cls.binaryCache[key], env if env is not None else {}, namespace)
+    return namespace['factory'](*([Struct(schema.formats[i]).unpack_from for i in fields] + [Types.stringPadding]))
+
+  # Compiled vectorized code objects, by expressions and input schema, or None if unsupported.
+  vectorizedCache = {}
+
+  # Returns a function evaluating the given predicate over a structured array of
+  # tuples of the given schema, as a boolean mask. Returns None if the predicate
+  # cannot be vectorized.
+  @classmethod
+  def compileVectorized(cls, expr, schema):
+    return cls.compileVectorizedFunction((expr,), schema, True)
+
+  # Returns a function evaluating a list of expressions over a structured array of
+  # tuples of the given schema, as a tuple of columns. Returns None if any expression
+  # cannot be vectorized.
+  @classmethod
+  def compileVectorizedProjection(cls, exprs, schema):
+    return cls.compileVectorizedFunction(tuple(exprs), schema, False)
+
+  @classmethod
+  def compileVectorizedFunction(cls, exprs, schema, isPredicate):
+    key = (exprs, tuple(schema.schema()), isPredicate)
+    if key not in cls.vectorizedCache:
+      translator = VectorizedTranslator(schema)
+      try:
+        translations = [translator.translate(e) for e in exprs]
+      except ValueError:
+        translations = None
+
+      if translations is None or (isPredicate and translations[0][1] != 'bool') \
+          or (isPredicate and not translator.columns):
+        cls.vectorizedCache[key] = None
+
+      else:
+        source = ["def expression(batch):"]
+        for (i, field) in enumerate(translator.columns):
+          source.append("  c" + str(i) + " = " + translator.column(field))
+        if isPredicate:
+          source.append("  return " + translations[0][0])
+        else:
+          source.append("  return (" + ''.join([t[0] + ", " for t in translations]) + ")")
+        cls.vectorizedCache[key] = compile('\n'.join(source), '<expression>', 'exec')
+
+    if cls.vectorizedCache[key] is None:
+      return None
+
+    import numpy as np
+    namespace = {}
+    exec(cls.vectorizedCache[key], {'np': np}, namespace)
+    return namespace['expression']
+
+
+# Translates a Python expression into NumPy column operations over a schema's attributes.
+# Boolean connectives become element-wise operators, and chained comparisons are split.
+# Each translation is a pair of source text and the kind of its value: 'bool', 'number' or 'string'.
+# Character sequence attributes are only supported as plain projections.
+class VectorizedTranslator(ast.NodeVisitor):
+  binaryOps  = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/',
+                ast.FloorDiv: '//', ast.Mod: '%'}
+  compareOps = {ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>='}
+  unaryOps   = {ast.UAdd: '+', ast.USub: '-'}
+
+  # NumPy types for evaluating columns, widened to match Python's integers and floats.
+  columnTypes = {'B': 'i8', 'h': 'i8', 'i': 'i8', 'f': 'f8', 'd': 'f8'}
+
+  def __init__(self, schema):
+    self.schema = schema
+    self.columns = []
+
+  def translate(self, expr):
+    tree = ast.parse(expr.strip(), mode='eval')
+    (source, kind) = self.visit(tree)
+    if kind == 'string' and not isinstance(tree.body, ast.Name):
+      raise ValueError("Unsupported character sequence expression: " + expr)
+    return (source, kind)
+
+  # Returns the source text loading an attribute's column from the batch.
+  def column(self, field):
+    fmt = self.schema.formats[self.schema.fields.index(field)]
+    if fmt[-1] in self.columnTypes:
+      return "batch['" + field + "'].astype('" + self.columnTypes[fmt[-1]] + "')"
+    return "batch['" + field + "']"
+
+  def generic_visit(self, node):
+    raise ValueError("Unsupported vectorized expression: " + type(node).__name__)
+
+  def visit_Expression(self, node):
+    return self.visit(node.body)
+
+  def visit_Name(self, node):
+    if node.id in self.schema.fields:
+      if node.id not in self.columns:
+        self.columns.append(node.id)
+      isString = self.schema.fields.index(node.id) in self.schema.stringFields
+      return ("c" + str(self.columns.index(node.id)), 'string' if isString else 'number')
+    elif node.id in ('True', 'False'):
+      return ("np." + node.id + "_", 'bool')
+    raise ValueError("Unsupported name in vectorized expression: " + node.id)
+
+  def visit_Constant(self, node):
+    if isinstance(node.value, bool):
+      return ("np." + repr(node.value) + "_", 'bool')
+    elif isinstance(node.value, (int, float)):
+      return (repr(node.value), 'number')
+    raise ValueError("Unsupported constant in vectorized expression: " + repr(node.value))
+
+  def visit_Num(self, node):
+    return (repr(node.n), 'number')
+
+  def visit_NameConstant(self, node):
+    return self.visit_Constant(node)
+
+  def operand(self, node, kinds):
+    (source, kind) = self.visit(node)
+    if kind not in kinds:
+      raise ValueError("Unsupported operand in vectorized expression")
+    return source
+
+  def visit_BinOp(self, node):
+    op = self.binaryOps.get(type(node.op), None)
+    if op is None:
+      raise ValueError("Unsupported operator in vectorized expression")
+    return ("(" + self.operand(node.left, ['number']) + " " + op + " "
+            + self.operand(node.right, ['number']) + ")", 'number')
+
+  def visit_UnaryOp(self, node):
+    if isinstance(node.op, ast.Not):
+      return ("(~" + self.operand(node.operand, ['bool']) + ")", 'bool')
+    op = self.unaryOps.get(type(node.op), None)
+    if op is None:
+      raise ValueError("Unsupported operator in vectorized expression")
+    return ("(" + op + self.operand(node.operand, ['number']) + ")", 'number')
+
+  def visit_BoolOp(self, node):
+    op = ' & ' if isinstance(node.op, ast.And) else ' | '
+    return ("(" + op.join([self.operand(v, ['bool']) for v in node.values]) + ")", 'bool')
+
+  def visit_Compare(self, node):
+    operands = [self.operand(v, ['number', 'bool']) for v in [node.left] + node.comparators]
+    comparisons = []
+    for (i, cmpOp) in enumerate(node.ops):
+      op = self.compareOps.get(type(cmpOp), None)
+      if op is None:
+        raise ValueError("Unsupported comparison in vectorized expression")
+      comparisons.append("(" + operands[i] + " " + op + " " + operands[i+1] + ")")
+    return ("(" + ' & '.join(comparisons) + ")", 'bool')
+
+if __name__ == "__main__":
+  import doctest
+  doctest.testmod()
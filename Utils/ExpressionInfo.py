@@ -9,10 +9,12 @@ class ExpressionInfo(ast.NodeVisitor):
     self.names = []
     self.components = []
     self.onlyNames = True
+    self.body = None
     tree = ast.parse(self.expr)
     self.visit(tree)
 
   def visit_Expr(self, node):
+    self.body = node.value
     if not isinstance(node.value, ast.Name):
       self.onlyNames = False
 
@@ -41,3 +43,31 @@ class ExpressionInfo(ast.NodeVisitor):
 
   def isAttribute(self):
     return self.onlyNames
+
+  # Returns the attributes of an expression consisting of a single attribute, or of a
+  # tuple of attributes, in order. Returns None for any other expression.
+  def attributeList(self):
+    if isinstance(self.body, ast.Name):
+      return [self.body.id]
+    if isinstance(self.body, ast.Tuple) and all(isinstance(e, ast.Name) for e in self.body.elts):
+      return [e.id for e in self.body.elts]
+    return None
+
+  # Returns the pairs of attributes compared for equality by the expression's top-level
+  # conjuncts, where the first attribute of each pair is in lhsFields, and the second
+  # in rhsFields. Also returns whether these equalities are the whole expression.
+  def equalityPairs(self, lhsFields, rhsFields):
+    result = []
+    complete = True
+    for c in (self.components if self.components else [self.body]):
+      if isinstance(c, ast.Compare) and len(c.ops) == 1 and isinstance(c.ops[0], ast.Eq) \
+          and isinstance(c.left, ast.Name) and isinstance(c.comparators[0], ast.Name):
+        (l, r) = (c.left.id, c.comparators[0].id)
+        if l in lhsFields and r in rhsFields:
+          result.append((l, r))
+          continue
+        elif r in lhsFields and l in rhsFields:
+          result.append((r, l))
+          continue
+      complete = False
+    return (result, complete)